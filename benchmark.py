@@ -0,0 +1,193 @@
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from gdc_api import write_chunks, zstandard
+from mutation_landscape import (read_clinical_data, read_maf_files, create_mutation_matrix, sort_samples,
+                                create_mutation_landscape)
+
+# Benchmark settings
+scales = [  # synthetic cohort sizes
+    {"cases": 100, "genes": 2000, "mutations_per_case": 100},
+    {"cases": 500, "genes": 10000, "mutations_per_case": 200},
+    {"cases": 2000, "genes": 20000, "mutations_per_case": 300},
+]
+maf_workers = 1  # keep parsing in-process so that tracemalloc sees its memory
+filler_cols = 40  # extra MAF columns that the loaders have to skip over
+top_n_genes = 30
+seed = 0
+results_file = "bench_results.json"
+storage_formats = ["maf.gz", "maf.zst"]  # compressed-at-rest layouts compared against plain .maf
+
+# Rough share of each classification in TCGA MAFs; the last two are dropped by the landscape
+variant_weights = {
+    'Missense_Mutation': 0.45, 'Silent': 0.17, 'Nonsense_Mutation': 0.04, 'Frame_Shift_Del': 0.02,
+    'Frame_Shift_Ins': 0.01, 'Splice_Site': 0.02, 'In_Frame_Del': 0.005, 'In_Frame_Ins': 0.002,
+    'Translation_Start_Site': 0.001, 'Nonstop_Mutation': 0.001, "3'UTR": 0.15, 'Intron': 0.128,
+}
+
+def case_barcode(i):
+    return f"TCGA-XX-{i:04d}"
+
+def generate_cohort(directory, cases, genes, mutations_per_case, seed=seed):
+    """Write synthetic TCGA-shaped MAFs and a clinical_patient file into directory.
+
+    Genes are drawn from a Zipf-like distribution so that a few are mutated in
+    many samples, as in real cohorts. Returns (clinical_file, snv_dir, include).
+    """
+    rng = np.random.default_rng(seed)
+    gene_names = np.array([f"GENE{i}" for i in range(genes)])
+    gene_p = 1.0 / np.arange(1, genes + 1) ** 1.1
+    gene_p /= gene_p.sum()
+    variants = np.array(list(variant_weights))
+    variant_p = np.array(list(variant_weights.values()))
+    variant_p /= variant_p.sum()
+    filler = "\t".join(["."] * filler_cols)
+    filler_header = "\t".join(f"Column_{i}" for i in range(filler_cols))
+
+    snv_dir = os.path.join(directory, "data_snv_SYN")
+    os.makedirs(snv_dir, exist_ok=True)
+    for i in range(cases):
+        n = max(int(rng.poisson(mutations_per_case)), 1)
+        sample = f"{case_barcode(i)}-01A-11D-A000-08"
+        with open(os.path.join(snv_dir, f"{case_barcode(i)}.maf"), "w") as f:
+            f.write("#version 2.4\n")
+            f.write(f"Hugo_Symbol\tVariant_Classification\tTumor_Sample_Barcode\t{filler_header}\n")
+            for gene, variant in zip(rng.choice(gene_names, n, p=gene_p), rng.choice(variants, n, p=variant_p)):
+                f.write(f"{gene}\t{variant}\t{sample}\t{filler}\n")
+
+    clinical_file = os.path.join(directory, "nationwidechildrens.org_clinical_patient_syn.txt")
+    histologies = ["Synthetic Type A", "Synthetic Type B"]
+    with open(clinical_file, "w") as f:
+        f.write("bcr_patient_uuid\tbcr_patient_barcode\thistologic_diagnosis\tajcc_pathologic_tumor_stage\t"
+                "vital_status\tdeath_days_to\tgender\trace\n")
+        f.write("bcr_patient_uuid\tbcr_patient_barcode\thistologic_diagnosis\tajcc_pathologic_tumor_stage\t"
+                "vital_status\tdeath_days_to\tgender\trace\n")
+        f.write("CDE_ID:\tCDE_ID:2003301\tCDE_ID:3081934\tCDE_ID:3203222\tCDE_ID:5\tCDE_ID:3165475\t"
+                "CDE_ID:2200604\tCDE_ID:2192199\n")
+        for i in range(cases):
+            dead = rng.random() < 0.5
+            f.write(f"uuid-{i}\t{case_barcode(i)}\t{histologies[i % 2]}\tStage {'I' * (i % 3 + 1)}\t"
+                    f"{'Dead' if dead else 'Alive'}\t{int(rng.integers(30, 3000)) if dead else '[Not Applicable]'}\t"
+                    f"{'MALE' if i % 2 else 'FEMALE'}\tWHITE\n")
+    return clinical_file, snv_dir, {'histologic_diagnosis': histologies}
+
+def convert_cohort(snv_dir, storage_format):
+    """Copy a cohort of plain MAFs into a sibling directory stored as .maf.gz or .maf.zst"""
+    output_dir = f"{snv_dir}_{storage_format.replace('.', '_')}"
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(snv_dir):
+        with open(os.path.join(snv_dir, name), "rb") as f:
+            payload = gzip.compress(f.read())
+        output_file = os.path.join(output_dir, f"{name}{storage_format[len('maf'):]}")
+        write_chunks([payload], output_file, recompress="zstd" if storage_format == "maf.zst" else None)
+    return output_dir
+
+def directory_mb(directory):
+    return round(sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1e6, 2)
+
+def measure(stage, func, items=0):
+    """Run func once and return (result, record) with wall time, peak traced memory and throughput"""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    record = {
+        "stage": stage,
+        "seconds": round(elapsed, 4),
+        "peak_mb": round(peak / 1e6, 2),
+        "items": items,
+        "items_per_s": round(items / elapsed, 1) if items and elapsed > 0 else None,
+    }
+    print(f"  {stage:<28} {elapsed:8.3f} s {peak / 1e6:9.1f} MB" +
+          (f" {record['items_per_s']:12.1f} items/s" if record["items_per_s"] else ""))
+    return result, record
+
+def run_scale(scale):
+    """Generate one synthetic cohort and time every pipeline stage on it"""
+    directory = tempfile.mkdtemp(prefix="pancancer_bench_")
+    try:
+        clinical_file, snv_dir, include = generate_cohort(directory, **scale)
+        maf_bytes = sum(os.path.getsize(os.path.join(snv_dir, name)) for name in os.listdir(snv_dir))
+        records = []
+
+        case_ids, record = measure("read_clinical_data", lambda: read_clinical_data(clinical_file, include),
+                                   scale["cases"])
+        records.append(record)
+        mutations_df, record = measure("read_maf_files", lambda: read_maf_files(snv_dir, case_ids, workers=maf_workers),
+                                       scale["cases"])
+        record["disk_mb"] = directory_mb(snv_dir)
+        records.append(record)
+        # Disk space against read throughput of the compressed-at-rest layouts
+        for storage_format in storage_formats:
+            if storage_format == "maf.zst" and zstandard is None:
+                print("  (zstandard not installed, skipping .maf.zst)")
+                continue
+            format_dir = convert_cohort(snv_dir, storage_format)
+            _, record = measure(f"read_maf_files ({storage_format})",
+                                lambda: read_maf_files(format_dir, case_ids, workers=maf_workers), scale["cases"])
+            record["disk_mb"] = directory_mb(format_dir)
+            records.append(record)
+        rows = len(mutations_df)
+        (mutation_matrix, _, _), record = measure("create_mutation_matrix",
+                                                  lambda: create_mutation_matrix(mutations_df, top_n_genes), rows)
+        records.append(record)
+        _, record = measure("sort_samples", lambda: sort_samples(mutation_matrix), mutation_matrix.shape[1])
+        records.append(record)
+        output_file = os.path.join(directory, "landscape.png")
+        _, record = measure("create_mutation_landscape",
+                            lambda: create_mutation_landscape(mutations_df, output_file, top_n_genes), rows)
+        records.append(record)
+
+        # Download path without the network: gunzip a cohort's worth of MAF bytes to disk
+        payload = gzip.compress(b"".join(open(os.path.join(snv_dir, name), "rb").read()
+                                         for name in sorted(os.listdir(snv_dir))))
+        chunks = [payload[i:i + (1 << 20)] for i in range(0, len(payload), 1 << 20)]
+        _, record = measure("write_chunks (gunzip)",
+                            lambda: write_chunks(chunks, os.path.join(directory, "stream.maf"), decompress=True),
+                            maf_bytes)
+        records.append(record)
+
+        for record in records:
+            record.update(scale, rows=rows, maf_mb=round(maf_bytes / 1e6, 2))
+        return records
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(output_file=results_file):
+    records = []
+    for scale in scales:
+        print(f"Scale: {scale['cases']} cases, {scale['genes']} genes, {scale['mutations_per_case']} mutations/case")
+        records.extend(run_scale(scale))
+
+    results = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": records,
+    }
+    with open(output_file, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output_file}")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else results_file)
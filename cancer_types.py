@@ -0,0 +1,138 @@
+import os
+
+# Structured form of tmp_cancer_type.md: for every TCGA cohort, the clinical_patient
+# columns holding each harmonised field and the histologies grouped into diagnoses.
+clinical_dir = "data_clinical"
+clinical_fields = ['case_id', 'diagnosis', 'stage', 'vital_status', 'days_death', 'gender', 'race']
+
+cancer_types = {
+    'ACC': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'days_to_death', 'gender', 'race'],
+        'diagnoses': {
+            "Adrenocortical Carcinoma- Myxoid Type": "Adrenocortical Carcinoma",
+            "Adrenocortical Carcinoma- Oncocytic Type": "Adrenocortical Carcinoma",
+            "Adrenocortical carcinoma- Usual Type": "Adrenocortical Carcinoma",
+        },
+    },
+    'BLCA': {
+        'columns': ['bcr_patient_barcode', 'histologic_subtype', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Non-Papillary": "Bladder Urothelial Carcinoma",
+            "Papillary": "Bladder Urothelial Carcinoma",
+        },
+    },
+    'BRCA': {
+        'columns': ['bcr_patient_barcode', 'histological_type', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Infiltrating Ductal Carcinoma": "Breast Invasive Ductal Carcinoma",
+            "Infiltrating Lobular Carcinoma": "Breast Invasive Lobular Carcinoma",
+        },
+    },
+    'CESC': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'clinical_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Cervical Squamous Cell Carcinoma": "Cervical Squamous Cell Carcinoma",
+            "Endocervical Adenocarcinoma of the Usual Type": "Endocervical Adenocarcinoma",
+            "Endocervical Type of Adenocarcinoma": "Endocervical Adenocarcinoma",
+            "Mucinous Adenocarcinoma of Endocervical Type": "Endocervical Adenocarcinoma",
+        },
+    },
+    'CHOL': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Cholangiocarcinoma; distal": "Cholangiocarcinoma",
+            "Cholangiocarcinoma; hilar/perihilar": "Cholangiocarcinoma",
+            "Cholangiocarcinoma; intrahepatic": "Cholangiocarcinoma",
+        },
+    },
+    'COAD': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Colon Adenocarcinoma": "Colonic Adenocarcinoma",
+            "Colon Mucinous Adenocarcinoma": "Colonic Adenocarcinoma",
+        },
+    },
+    'DLBC': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'clinical_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Diffuse large B-cell lymphoma (DLBCL) NOS (any anatomic site nodal or extranodal)":
+                "Diffuse Large B-Cell Lymphoma",
+        },
+    },
+    'ESCA': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Esophagus Adenocarcinoma, NOS": "Esophageal Adenocarcinoma",
+            "Esophagus Squamous Cell Carcinoma": "Esophageal Squamous Cell Carcinoma",
+        },
+    },
+    'GBM': {
+        # No stage column in the GBM clinical file
+        'columns': ['bcr_patient_barcode', 'histological_type', None, 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Glioblastoma Multiforme (GBM)": "Glioblastoma",
+            "Treated primary GBM": "Glioblastoma",
+            "Untreated primary (de novo) GBM": "Glioblastoma",
+        },
+    },
+    'HNSC': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Head & Neck Squamous Cell Carcinoma": "Head and Neck Squamous Cell Carcinoma",
+        },
+    },
+    'KICH': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Kidney Chromophobe": "Chromophobe Renal Cell Carcinoma",
+        },
+    },
+    'KIRC': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Kidney Clear Cell Renal Carcinoma": "Clear Cell Renal Cell Carcinoma",
+        },
+    },
+    'KIRP': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Kidney Papillary Renal Cell Carcinoma": "Papillary Renal Cell Carcinoma",
+        },
+    },
+    'PAAD': {
+        'columns': ['bcr_patient_barcode', 'histologic_diagnosis', 'ajcc_pathologic_tumor_stage', 'vital_status',
+                    'death_days_to', 'gender', 'race'],
+        'diagnoses': {
+            "Pancreas-Adenocarcinoma Ductal Type": "Pancreatic Ductal Adenocarcinoma",
+        },
+    },
+}
+
+def clinical_file(cohort, directory=clinical_dir):
+    """Path of the clinical_patient file of a cohort"""
+    return os.path.join(directory, f"nationwidechildrens.org_clinical_patient_{cohort.lower()}.txt")
+
+def cohort_columns(cohort):
+    """Map each harmonised field to the source column of a cohort (None if it has none)"""
+    return dict(zip(clinical_fields, cancer_types[cohort]['columns']))
+
+def cohort_landscapes(cohort):
+    """List (diagnosis, include) pairs of a cohort, include being the filter used by read_clinical_data"""
+    diagnosis_col = cohort_columns(cohort)['diagnosis']
+    histologies = {}
+    for histology, diagnosis in cancer_types[cohort]['diagnoses'].items():
+        histologies.setdefault(diagnosis, []).append(histology)
+    return [(diagnosis, {diagnosis_col: values}) for diagnosis, values in histologies.items()]
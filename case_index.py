@@ -0,0 +1,74 @@
+import os
+import glob
+import pandas as pd
+from download_manifest import DownloadManifest, manifest_name
+from mutation_store import maf_case_files, read_mafs, snv_prefix, maf_cols, n_workers
+from tmp_combine_cohort import load_clinical_cohorts
+
+# Index settings
+index_file = "case_index.parquet"  # one row per case: clinical fields, cohort, MAF location, file_id and md5
+clinical_dir = "data_clinical"
+maf_index_cols = ['case_id', 'cohort', 'maf_file', 'file_id', 'md5sum']
+
+def cohort_maf_files(snv_dir, cohort):
+    """List the MAFs of a cohort from its download manifest, scanning the directory only if there is none"""
+    rows = []
+    if os.path.exists(os.path.join(snv_dir, manifest_name)):
+        manifest = DownloadManifest(snv_dir)
+        for file_id, md5sum, output_file in manifest.done_files():
+            case_id = os.path.basename(output_file).split(".maf")[0]
+            rows.append((case_id, cohort, output_file, file_id, md5sum))
+        manifest.close()
+    else:
+        for case_id, maf_file in maf_case_files(snv_dir).items():
+            rows.append((case_id, cohort, maf_file, None, None))
+    return pd.DataFrame(rows, columns=maf_index_cols)
+
+def build_case_index(clinical_dir=clinical_dir, snv_dirs=None, output_file=index_file):
+    """Join the combined clinical table with the MAF of every case and save it as Parquet.
+
+    Cases with a MAF but no clinical row, or the other way round, are kept with
+    the missing side left empty.
+    """
+    if snv_dirs is None:
+        snv_dirs = sorted(d for d in glob.glob(snv_prefix + "*") if os.path.isdir(d))
+    mafs = [cohort_maf_files(snv_dir, os.path.basename(os.path.normpath(snv_dir))[len(snv_prefix):])
+            for snv_dir in snv_dirs]
+    mafs = pd.concat(mafs, ignore_index=True) if mafs else pd.DataFrame(columns=maf_index_cols)
+    clinical = load_clinical_cohorts(clinical_dir)
+    clinical = clinical.assign(case_id=clinical['case_id'].astype(str), cohort=clinical['cohort'].astype(str))
+
+    index = clinical.merge(mafs, on=['cohort', 'case_id'], how='outer')
+    for col in ['cohort', 'diagnosis', 'histology', 'stage', 'vital_status', 'gender', 'race']:
+        index[col] = index[col].astype('category')
+    index.to_parquet(output_file, index=False)
+    print(f"Indexed {len(index)} cases ({index['maf_file'].notna().sum()} with a MAF)")
+    return index
+
+def load_case_index(output_file=index_file):
+    return pd.read_parquet(output_file)
+
+def select_cases(index, **filters):
+    """Select cases matching every filter, each a field name mapped to its accepted values.
+
+    e.g. select_cases(index, diagnosis=["Pancreatic Ductal Adenocarcinoma"], stage=["Stage IA", "Stage IB"])
+    selects across all cohorts at once.
+    """
+    mask = pd.Series(True, index=index.index)
+    for field, values in filters.items():
+        if isinstance(values, str):
+            values = [values]
+        mask &= index[field].isin(values)
+    return index[mask]
+
+def read_case_mutations(selection, columns=maf_cols, workers=n_workers):
+    """Read the MAFs of selected cases straight from their indexed locations"""
+    with_maf = selection[selection['maf_file'].notna()]
+    missing = selection.loc[selection['maf_file'].isna(), 'case_id'].tolist()
+    if missing:
+        print(f"{len(missing)} selected cases have no MAF")
+    case_files = dict(zip(with_maf['case_id'], with_maf['maf_file']))
+    return read_mafs(case_files, columns, workers)
+
+if __name__ == "__main__":
+    build_case_index()
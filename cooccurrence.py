@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import hypergeom
+from mutation_matrix import SparseMutationMatrix
+
+block_genes = 64  # genes ANDed against all others at a time, bounds the size of the intermediate
+popcount_table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def pack_genes(mutation_matrix):
+    """Pack the mutated/unmutated gene x sample matrix into one bitset row per gene"""
+    if isinstance(mutation_matrix, SparseMutationMatrix):
+        genes, binary = mutation_matrix.genes, (mutation_matrix.counts > 0).toarray()
+    else:
+        genes, binary = mutation_matrix.index, np.asarray(mutation_matrix) > 0
+    return pd.Index(genes), np.packbits(binary, axis=1), binary.shape[1]
+
+def popcount(bits):
+    """Number of set bits along the last axis of a uint8 array"""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    return popcount_table[bits].sum(axis=-1, dtype=np.int64)
+
+def pair_counts(bits):
+    """Samples mutated in both genes, for every pair of genes (gene x gene matrix)"""
+    n_genes = bits.shape[0]
+    both = np.empty((n_genes, n_genes), dtype=np.int64)
+    for start in range(0, n_genes, block_genes):
+        block = bits[start:start + block_genes]
+        both[start:start + len(block)] = popcount(block[:, None, :] & bits[None, :, :])
+    return both
+
+def benjamini_hochberg(p_values):
+    """False discovery rate adjusted p-values"""
+    p_values = np.asarray(p_values, dtype=float)
+    n = len(p_values)
+    if n == 0:
+        return p_values
+    order = np.argsort(p_values)
+    ranked = p_values[order] * n / np.arange(1, n + 1)
+    adjusted = np.minimum.accumulate(ranked[::-1])[::-1]
+    result = np.empty(n)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+def cooccurrence_table(mutation_matrix):
+    """Pairwise co-occurrence and mutual exclusivity of the genes of a landscape.
+
+    Every 2x2 table comes from popcounts over the packed bitsets. The
+    one-sided Fisher exact tests are evaluated in batch through the
+    hypergeometric distribution, then adjusted for multiple testing
+    (Benjamini-Hochberg). Returns one row per gene pair.
+    """
+    genes, bits, n_samples = pack_genes(mutation_matrix)
+    mutated = popcount(bits)
+    both = pair_counts(bits)
+
+    i, j = np.triu_indices(len(genes), k=1)
+    a = both[i, j]
+    b = mutated[i] - a
+    c = mutated[j] - a
+    d = n_samples - a - b - c
+    # P(X >= a) for co-occurrence and P(X <= a) for exclusivity, X ~ samples mutated in both by chance
+    p_cooccurrence = hypergeom.sf(a - 1, n_samples, mutated[i], mutated[j])
+    p_exclusivity = hypergeom.cdf(a, n_samples, mutated[i], mutated[j])
+    log2_odds_ratio = np.log2(((a + 0.5) * (d + 0.5)) / ((b + 0.5) * (c + 0.5)))
+
+    table = pd.DataFrame({
+        'gene_a': genes[i],
+        'gene_b': genes[j],
+        'both': a,
+        'a_only': b,
+        'b_only': c,
+        'neither': d,
+        'log2_odds_ratio': log2_odds_ratio.round(3),
+        'p_cooccurrence': p_cooccurrence,
+        'p_exclusivity': p_exclusivity,
+        'q_cooccurrence': benjamini_hochberg(p_cooccurrence),
+        'q_exclusivity': benjamini_hochberg(p_exclusivity),
+    })
+    table['relation'] = np.where(log2_odds_ratio > 0, 'co-occurrence', 'exclusivity')
+    return table.sort_values(['q_cooccurrence', 'q_exclusivity']).reset_index(drop=True)
@@ -1,11 +1,14 @@
-import requests
-import json
 import os
 from urllib.request import urlretrieve
+from gdc_api import query_files, get_session, batched, download_batch
+from download_manifest import DownloadManifest
+from instrumentation import report, profile
 
-def get_files():
-    files_endpt = "https://api.gdc.cancer.gov/files"
+batch_size = 50  # files per bulk /data POST archive; 1 downloads each file with its own GET
+report_file = None  # write the per-stage run report here (.json or .csv)
+profile_file = None  # dump cProfile stats of the run here
 
+def get_files():
     filters = {
         "op": "and",
         "content":[
@@ -33,50 +36,52 @@ def get_files():
         ]
     }
 
-    params = {
-        "filters": json.dumps(filters),
-        "fields": "file_id,file_name",
-        "format": "JSON",
-        "size": "100"
-    }
-    
-    response = requests.get(files_endpt, params=params)
-    file_data = json.loads(response.content.decode("utf-8"))
-    
-    return file_data["data"]["hits"]
+    return query_files(filters, "file_id,file_name,md5sum,file_size")
 
 
-def download_files(file_hits, output_dir):
-    data_endpt = "https://api.gdc.cancer.gov/data/"
-    
+def download_files(file_hits, output_dir, batch=batch_size):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
-    for hit in file_hits:
-        file_id = hit["file_id"]
-        file_name = hit["file_name"]
-        output_file = os.path.join(output_dir, f"{file_name}")
-        
-        print(f"Downloading {file_name}...")
-        response = requests.get(f"{data_endpt}{file_id}", headers={"Content-Type": "application/json"})
-        with open(output_file, 'wb') as f:
-            f.write(response.content)
+
+    session = get_session()
+    manifest = DownloadManifest(output_dir)
+    pending = [hit for hit in file_hits
+               if manifest.needs_download(hit, os.path.join(output_dir, hit["file_name"]))]
+    print(f"{len(file_hits) - len(pending)} files up to date, {len(pending)} to download")
+
+    def failed(hit, output_file, error):
+        manifest.mark_failed(hit, output_file, error)
+        print(f"Error downloading {hit['file_name']}: {str(error)}")
+
+    for hits in batched(pending, max(batch, 1)):
+        print(f"Downloading batch of {len(hits)} files...")
+        download_batch(hits, lambda hit: os.path.join(output_dir, hit["file_name"]),
+                       lambda hit, output_file, nbytes: manifest.mark_done(hit, output_file), failed, session)
+    print(f"Manifest: {manifest.summary()}")
+    manifest.close()
 
 
 def main():
+    report.reset("download_clinical")
     print("Exploring files ...")
-    file_hits = get_files()
-    # for file in file_hits:
-    #     print(file)
-    
-    if not file_hits:
-        print("No files found matching")
-        return
-    print(f"Found {len(file_hits)} matching files")
-    
-    print("Starting downloads...")
-    download_files(file_hits, "data_clinical")
-    print("Download complete!")
+    with profile(profile_file):
+        with report.stage("metadata query"):
+            file_hits = get_files()
+        # for file in file_hits:
+        #     print(file)
+        
+        if not file_hits:
+            print("No files found matching")
+            return
+        print(f"Found {len(file_hits)} matching files")
+        
+        print("Starting downloads...")
+        with report.stage("download"):
+            download_files(file_hits, "data_clinical")
+        print("Download complete!")
+    report.summary()
+    if report_file:
+        report.write(report_file)
 
 if __name__ == "__main__":
     main()
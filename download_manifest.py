@@ -0,0 +1,85 @@
+import os
+import time
+import sqlite3
+import threading
+
+manifest_name = ".manifest.sqlite"  # manifest file kept inside each download directory
+
+class DownloadManifest:
+    """Local record of downloaded GDC files used for resumable, incremental syncs.
+
+    Each file_id is stored with the md5sum and file_size reported by the GDC,
+    the local output file and its size, a state ("done" or "failed") and the
+    time of the last update. A file needs downloading when it is new, its md5
+    changed upstream, its last attempt failed, or the local copy is missing or
+    no longer has the size it was written with.
+    """
+    def __init__(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = os.path.join(output_dir, manifest_name)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "file_id TEXT PRIMARY KEY, file_name TEXT, md5sum TEXT, file_size INTEGER, "
+            "output_file TEXT, output_size INTEGER, state TEXT, error TEXT, updated REAL)"
+        )
+        self.conn.commit()
+
+    def get(self, file_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT md5sum, output_file, output_size, state FROM files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["md5sum", "output_file", "output_size", "state"], row))
+
+    def needs_download(self, hit, output_file):
+        """Whether a listed file is new, changed, failed or missing locally"""
+        record = self.get(hit["file_id"])
+        if record is None or record["state"] != "done":
+            return True
+        if hit.get("md5sum") and hit["md5sum"] != record["md5sum"]:
+            return True
+        if record["output_file"] != output_file or not os.path.exists(output_file):
+            return True
+        return os.path.getsize(output_file) != record["output_size"]
+
+    def mark(self, hit, output_file, state, error=None):
+        output_size = os.path.getsize(output_file) if state == "done" else None
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (hit["file_id"], hit.get("file_name"), hit.get("md5sum"), hit.get("file_size"),
+                 output_file, output_size, state, error, time.time())
+            )
+            self.conn.commit()
+
+    def mark_done(self, hit, output_file):
+        self.mark(hit, output_file, "done")
+
+    def mark_failed(self, hit, output_file, error):
+        self.mark(hit, output_file, "failed", str(error))
+
+    def stale(self, file_hits):
+        """file_ids recorded locally that are no longer in the GDC listing"""
+        listed = {hit["file_id"] for hit in file_hits}
+        with self.lock:
+            rows = self.conn.execute("SELECT file_id, output_file FROM files").fetchall()
+        return [(file_id, output_file) for file_id, output_file in rows if file_id not in listed]
+
+    def done_files(self):
+        """(file_id, md5sum, output_file) of every file downloaded successfully"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT file_id, md5sum, output_file FROM files WHERE state = 'done'"
+            ).fetchall()
+
+    def summary(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,47 +1,54 @@
 cohort = 'PAAD'
-import requests
-import json
+n_workers = 8  # number of parallel download workers
+rate_limit = 10  # maximum requests per second across all workers
+keep_compressed = False  # keep MAFs compressed on disk: "gzip" as delivered (.maf.gz), "zstd" (.maf.zst) or False
+batch_size = 50  # files per bulk /data POST archive; 1 downloads each file with its own GET
+report_file = None  # write the per-stage run report here (.json or .csv)
+profile_file = None  # dump cProfile stats of the run here
 import os
-import gzip
 import time
-from urllib.request import urlretrieve
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from requests.exceptions import RequestException
-
-def create_session_with_retry():
-    """Create a requests session with retry strategy"""
-    session = requests.Session()
-    retries = Retry(
-        total=5,  # number of retries
-        backoff_factor=1,  # wait 1, 2, 4, 8, 16 seconds between retries
-        status_forcelist=[500, 502, 503, 504, 104],  # HTTP status codes to retry on
-        allowed_methods=["HEAD", "GET", "OPTIONS"]  # HTTP methods to retry
-    )
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    return session
-
-def make_request_with_retry(url, params=None, headers=None, max_retries=5):
-    """Make HTTP request with retry logic"""
-    session = create_session_with_retry()
-    
-    for attempt in range(max_retries):
-        try:
-            if params:
-                response = session.get(url, params=params, headers=headers)
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gdc_api import query_files, get_session, RateLimiter, batched, download_batch
+from download_manifest import DownloadManifest
+from instrumentation import report, profile
+
+class DownloadProgress:
+    """Aggregate progress and throughput over all download workers"""
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = []
+        self.bytes = 0
+        self.start_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, case_id, status, nbytes=0, error=None):
+        with self.lock:
+            if status == "skipped":
+                self.skipped += 1
+            elif status == "failed":
+                self.failed.append((case_id, error))
             else:
-                response = session.get(url, headers=headers)
-            response.raise_for_status()
-            return response
-        except RequestException as e:
-            if attempt == max_retries - 1:  # Last attempt
-                raise e
-            wait_time = (2 ** attempt) + 1  # Exponential backoff
-            print(f"Request failed, retrying in {wait_time} seconds... (Attempt {attempt + 1}/{max_retries})")
-            time.sleep(wait_time)
+                self.done += 1
+            self.bytes += nbytes
+            finished = self.done + self.skipped + len(self.failed)
+            elapsed = max(time.monotonic() - self.start_time, 1e-6)
+            if status == "failed":
+                print(f"[{finished}/{self.total}] Error processing {case_id}: {error}")
+            elif status == "done":
+                print(f"[{finished}/{self.total}] Processed {case_id} "
+                      f"({self.done / elapsed:.1f} files/s, {self.bytes / elapsed / 1e6:.2f} MB/s)")
+
+    def summary(self):
+        elapsed = time.monotonic() - self.start_time
+        print(f"Downloaded {self.done}, skipped {self.skipped}, failed {len(self.failed)} "
+              f"in {elapsed:.1f} s ({self.bytes / 1e6:.1f} MB)")
+        for case_id, error in self.failed:
+            print(f"  failed: {case_id} ({error})")
 
 def get_files():
-    files_endpt = "https://api.gdc.cancer.gov/files"
     filters = {
         "op": "and",
         "content":[
@@ -68,74 +75,94 @@ def get_files():
             }
         ]
     }
-   
-    params = {
-        "filters": json.dumps(filters),
-        "fields":"file_id,file_name,cases.submitter_id",
-        "format": "JSON",
-        "size": "1000"
-    }
-   
-    response = make_request_with_retry(files_endpt, params=params)
-    file_data = json.loads(response.content.decode("utf-8"))
-   
-    return file_data["data"]["hits"]
-
-def download_and_process_files(file_hits, output_dir):
-    data_endpt = "https://api.gdc.cancer.gov/data/"
-   
+
+    return query_files(filters, "file_id,file_name,md5sum,file_size,cases.submitter_id")
+
+def maf_output_file(output_dir, case_id, compressed=keep_compressed):
+    """Path of the final MAF for a case"""
+    suffix = ".maf.zst" if compressed == "zstd" else ".maf.gz" if compressed else ".maf"
+    return os.path.join(output_dir, f"{case_id}{suffix}")
+
+def maf_write_options(compressed=keep_compressed):
+    """write_chunks arguments turning a delivered .maf.gz into the configured on-disk format"""
+    return {"decompress": not compressed, "recompress": "zstd" if compressed == "zstd" else None}
+
+def download_and_process_batch(hits, output_dir, session, rate_limiter, progress, manifest,
+                               compressed=keep_compressed):
+    """Fetch a batch of MAFs as one /data archive, falling back to single GETs for what it missed"""
+    def done(hit, output_file, nbytes):
+        manifest.mark_done(hit, output_file)
+        progress.update(hit["cases"][0]["submitter_id"], "done", nbytes)
+
+    def failed(hit, output_file, error):
+        manifest.mark_failed(hit, output_file, error)
+        progress.update(hit["cases"][0]["submitter_id"], "failed", error=str(error))
+
+    download_batch(hits, lambda hit: maf_output_file(output_dir, hit["cases"][0]["submitter_id"], compressed),
+                   done, failed, session, rate_limiter, **maf_write_options(compressed))
+
+def download_and_process_files(file_hits, output_dir, workers=n_workers, rate=rate_limit,
+                               compressed=keep_compressed, batch=batch_size):
+    """Sync MAFs with a pool of workers sharing one session and rate limit.
+
+    Only files that the local manifest reports as new, changed upstream, failed
+    or missing on disk are fetched; everything else is skipped.
+    """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-   
+
+    session = get_session(pool_size=workers)
+    rate_limiter = RateLimiter(rate, concurrency=workers)
+    progress = DownloadProgress(len(file_hits))
+    manifest = DownloadManifest(output_dir)
+
+    pending = []
     for hit in file_hits:
-        file_id = hit["file_id"]
-        file_name = hit["file_name"]
         case_id = hit["cases"][0]["submitter_id"]
-       
-        temp_gz_file = os.path.join(output_dir, f"{file_name}")
-        final_output_file = os.path.join(output_dir, f"{case_id}.maf")
-        if os.path.exists(final_output_file):
-            continue
-       
-        time.sleep(0.1)
-        try:
-            response = make_request_with_retry(
-                f"{data_endpt}{file_id}", 
-                headers={"Content-Type": "application/json"}
-            )
-            
-            with open(temp_gz_file, 'wb') as f:
-                f.write(response.content)
-           
-            with gzip.open(temp_gz_file, 'rb') as gz_file:
-                with open(final_output_file, 'wb') as output_file:
-                    output_file.write(gz_file.read())
-           
-            os.remove(temp_gz_file)
-            print(f"Processed {case_id}.maf")
-            
-        except Exception as e:
-            print(f"Error processing {case_id}: {str(e)}")
-            if os.path.exists(temp_gz_file):
-                os.remove(temp_gz_file)
-            continue
+        if manifest.needs_download(hit, maf_output_file(output_dir, case_id, compressed)):
+            pending.append(hit)
+        else:
+            progress.update(case_id, "skipped")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(download_and_process_batch, hits, output_dir, session, rate_limiter, progress, manifest,
+                            compressed)
+            for hits in batched(pending, max(batch, 1))
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+    progress.summary()
+    for file_id, output_file in manifest.stale(file_hits):
+        print(f"  no longer listed by the GDC: {file_id} ({output_file})")
+    manifest.close()
+    return progress.failed
 
 def main():
+    report.reset("download_snv")
     print("Exploring files...")
     try:
-        file_hits = get_files()
-       
-        if not file_hits:
-            print("No files found matching criteria")
-            return
-       
-        print(f"Found {len(file_hits)} matching files")
-       
-        print("Starting downloads...")
-        download_and_process_files(file_hits, "data_snv_"+cohort)
-        print("Download and processing complete!")
+        with profile(profile_file):
+            with report.stage("metadata query"):
+                file_hits = get_files()
+           
+            if not file_hits:
+                print("No files found matching criteria")
+                return
+           
+            print(f"Found {len(file_hits)} matching files")
+           
+            print("Starting downloads...")
+            with report.stage("download"):
+                download_and_process_files(file_hits, "data_snv_"+cohort)
+            print("Download and processing complete!")
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+    finally:
+        report.summary()
+        if report_file:
+            report.write(report_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Expression store settings
+counts_dir = "LIHC_RNA_counts"  # where tmp_download_snv.py puts the STAR count files
+store_dir = "data_expression_store"
+counts_suffix = ".rna_seq.augmented_star_gene_counts.tsv"
+value_column = "unstranded"  # or stranded_first, stranded_second, tpm_unstranded, fpkm_unstranded, ...
+n_workers = os.cpu_count() or 1  # processes parsing count files
+initial_capacity = 256  # sample columns preallocated, doubled whenever the matrix fills up
+
+def column_dtype(column):
+    """Raw read counts are stored as int32, normalised values (tpm, fpkm) as float32"""
+    return np.float32 if column.startswith(("tpm", "fpkm")) else np.int32
+
+def read_counts_file(counts_file, column=value_column):
+    """Parse one STAR gene counts file into (gene table, values), dropping the N_* summary rows"""
+    df = pd.read_csv(counts_file, sep='\t', comment='#', usecols=['gene_id', 'gene_name', 'gene_type', column])
+    df = df[~df['gene_id'].str.startswith('N_')]
+    return df[['gene_id', 'gene_name', 'gene_type']], df[column].to_numpy(dtype=column_dtype(column))
+
+class ExpressionMatrix:
+    """Genes x samples expression values in a memory-mapped .npy with gene and sample sidecars.
+
+    The array is stored column-major so that each sample is one contiguous
+    block, which makes appending samples a sequential write. Spare columns are
+    preallocated; only the first len(samples) are valid. Slicing reads just the
+    pages that are touched.
+    """
+    def __init__(self, directory=store_dir):
+        self.directory = directory
+        self.values_file = os.path.join(directory, "values.npy")
+        self.genes_file = os.path.join(directory, "genes.tsv")
+        self.samples_file = os.path.join(directory, "samples.tsv")
+        self.genes = pd.read_csv(self.genes_file, sep='\t') if os.path.exists(self.genes_file) else None
+        self.samples = (pd.read_csv(self.samples_file, sep='\t') if os.path.exists(self.samples_file)
+                        else pd.DataFrame(columns=['sample_id', 'case_id', 'source_file']))
+
+    @property
+    def values(self):
+        """Read-only memory map of the valid part of the matrix"""
+        values = np.load(self.values_file, mmap_mode='r')
+        return values[:, :len(self.samples)]
+
+    def select(self, genes=None, samples=None, by='gene_id'):
+        """DataFrame of some genes (by gene_id or gene_name) and/or samples, read from the memory map"""
+        gene_index = pd.Index(self.genes[by])
+        sample_index = pd.Index(self.samples['sample_id'])
+        rows = np.arange(len(gene_index)) if genes is None else gene_index.get_indexer(genes)
+        cols = np.arange(len(sample_index)) if samples is None else sample_index.get_indexer(samples)
+        if (rows < 0).any() or (cols < 0).any():
+            raise KeyError("Unknown gene or sample")
+        return pd.DataFrame(self.values[np.ix_(rows, cols)], index=gene_index[rows], columns=sample_index[cols])
+
+    def grow(self, n_genes, dtype, n_samples):
+        """Make room for n_samples valid columns, creating or doubling the memory map as needed"""
+        if not os.path.exists(self.values_file):
+            capacity = max(initial_capacity, n_samples)
+            np.lib.format.open_memmap(self.values_file, mode='w+', dtype=dtype, shape=(n_genes, capacity),
+                                      fortran_order=True).flush()
+            return
+        old = np.load(self.values_file, mmap_mode='r')
+        if n_samples <= old.shape[1]:
+            return
+        capacity = max(old.shape[1] * 2, n_samples)
+        temp_file = self.values_file + ".part"
+        new = np.lib.format.open_memmap(temp_file, mode='w+', dtype=old.dtype, shape=(old.shape[0], capacity),
+                                        fortran_order=True)
+        for start in range(0, len(self.samples), initial_capacity):
+            stop = min(start + initial_capacity, len(self.samples))
+            new[:, start:stop] = old[:, start:stop]
+        new.flush()
+        del new, old
+        os.replace(temp_file, self.values_file)
+
+    def append(self, counts_files, column=value_column, workers=n_workers):
+        """Parse count files not yet in the matrix in parallel and append them as new samples"""
+        known = set(self.samples['source_file'])
+        counts_files = [path for path in counts_files if os.path.basename(path) not in known]
+        if not counts_files:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+            parsed = executor.map(read_counts_file, counts_files, [column] * len(counts_files), chunksize=8)
+            start = len(self.samples)
+            self.grow_for(counts_files, column, start)
+            values = np.load(self.values_file, mmap_mode='r+')
+            gene_index = pd.Index(self.genes['gene_id'])
+            for k, (genes, sample_values) in enumerate(parsed):
+                if len(genes) == len(gene_index) and (genes['gene_id'].to_numpy() == gene_index.to_numpy()).all():
+                    values[:, start + k] = sample_values
+                else:
+                    # Different gene model or order: align on gene_id, genes it lacks stay 0
+                    values[:, start + k] = pd.Series(sample_values, index=genes['gene_id']).reindex(
+                        gene_index, fill_value=0).to_numpy()
+            values.flush()
+            del values
+
+        names = [os.path.basename(path) for path in counts_files]
+        sample_ids = [name[:-len(counts_suffix)] if name.endswith(counts_suffix) else name for name in names]
+        new_samples = pd.DataFrame({'sample_id': sample_ids, 'case_id': [s[:12] for s in sample_ids],
+                                    'source_file': names})
+        self.samples = pd.concat([self.samples, new_samples], ignore_index=True)
+        # The sample sidecar is written last, so an interrupted append leaves only unused spare columns
+        self.samples.to_csv(self.samples_file, sep='\t', index=False)
+        return len(counts_files)
+
+    def grow_for(self, counts_files, column, start):
+        """Set up the gene sidecar from the first file if needed and reserve the new columns"""
+        if self.genes is None:
+            self.genes, _ = read_counts_file(counts_files[0], column)
+            self.genes.to_csv(self.genes_file, sep='\t', index=False)
+        self.grow(len(self.genes), column_dtype(column), start + len(counts_files))
+
+def build_expression_matrix(input_dir=counts_dir, directory=store_dir, column=value_column, workers=n_workers):
+    """Add every STAR count file of input_dir that is not in the store yet"""
+    matrix = ExpressionMatrix(directory)
+    added = matrix.append(sorted(glob.glob(os.path.join(input_dir, "*" + counts_suffix))), column, workers)
+    print(f"Added {added} samples, {len(matrix.samples)} in total")
+    return matrix
+
+if __name__ == "__main__":
+    build_expression_matrix()
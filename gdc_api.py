@@ -0,0 +1,413 @@
+import os
+import json
+import time
+import hashlib
+import zlib
+import tarfile
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, HTTPError
+from instrumentation import report
+
+try:
+    import zstandard
+except ImportError:  # only needed to store MAFs as .maf.zst
+    zstandard = None
+
+# GDC API settings
+base_url = os.environ.get("GDC_API_URL", "https://api.gdc.cancer.gov").rstrip("/")  # e.g. a local mock_gdc_server
+files_endpt = f"{base_url}/files"
+cases_endpt = f"{base_url}/cases"
+data_endpt = f"{base_url}/data/"
+chunk_size = 1 << 20  # bytes read from a response body at a time
+cache_dir = ".gdc_cache"  # where metadata query results are kept between runs
+cache_ttl = 24 * 3600  # seconds before a cached query result is refreshed
+page_size = 1000  # hits requested per page of a metadata query
+zstd_level = 10  # compression level when recompressing downloads to zstd (multithreaded)
+
+def create_session_with_retry(pool_size=10):
+    """Create a requests session with keep-alive connection pooling.
+
+    The adapter does not retry by itself: make_request_with_retry is the one
+    retry policy, so attempts no longer multiply across two layers.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.pool_size = pool_size
+    return session
+
+def get_session(pool_size=10):
+    """Return the long-lived session shared by every download, growing its pool if needed"""
+    global shared_session
+    with session_lock:
+        if shared_session is None:
+            shared_session = create_session_with_retry(pool_size)
+        elif pool_size > shared_session.pool_size:
+            adapter = HTTPAdapter(max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+            shared_session.mount('https://', adapter)
+            shared_session.mount('http://', adapter)
+            shared_session.pool_size = pool_size
+        return shared_session
+
+shared_session = None
+session_lock = threading.Lock()
+
+class RateLimiter:
+    """Rate and concurrency limit shared by all workers, adapting to server health.
+
+    Request starts are spaced to stay under rate per second and at most
+    concurrency requests are in flight at a time (None for no limit); a
+    streamed response counts until its body is read and it is closed.
+    Throttling responses (429/5xx) and connection errors halve both, and each
+    success ramps them back up towards their initial values, additive
+    increase / multiplicative decrease. A Retry-After pauses every worker.
+    """
+    def __init__(self, rate, concurrency=None, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self.max_concurrency = concurrency
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.condition:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            interval = 1.0 / self.rate if self.rate else 0.0
+            self.next_time = max(now, self.next_time) + interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def acquire(self):
+        """Take one of the concurrent request slots, then wait for our turn"""
+        with self.condition:
+            while self.concurrency is not None and self.in_flight >= max(int(self.concurrency), 1):
+                self.condition.wait()
+            self.in_flight += 1
+        try:
+            self.wait()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def success(self):
+        with self.condition:
+            if self.rate and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+            if self.concurrency is not None and self.concurrency < self.max_concurrency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                self.condition.notify_all()
+
+    def throttle(self, retry_after=None):
+        with self.condition:
+            if self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+            if self.concurrency is not None:
+                self.concurrency = max(1.0, self.concurrency / 2)
+            if retry_after:
+                self.next_time = max(self.next_time, time.monotonic() + retry_after)
+        report.count("throttled")
+
+retry_status = (429, 500, 502, 503, 504)  # responses worth retrying, the rest of 4xx fail at once
+max_backoff = 60  # seconds
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay or HTTP date), None if absent"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+def make_request_with_retry(url, params=None, headers=None, max_retries=5, session=None, rate_limiter=None,
+                            stream=False, method="GET", json=None):
+    """Make HTTP request with retry logic.
+
+    Connection errors and retry_status responses are retried up to max_retries
+    attempts in all, waiting for Retry-After when the server sends one and
+    with jittered exponential backoff otherwise. Other HTTP errors raise at once.
+    A streamed response keeps its rate_limiter slot until close_response().
+    """
+    if session is None:
+        session = get_session()
+
+    for attempt in range(max_retries):
+        report.count("requests")
+        retry_after = None
+        held = False
+        try:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+                held = True
+            response = session.request(method, url, params=params, headers=headers, json=json, stream=stream)
+            if response.status_code not in retry_status:
+                if not response.ok:
+                    # Give the pooled connection back before failing, a streamed body is never read
+                    response.close()
+                    response.raise_for_status()
+                if rate_limiter is not None:
+                    rate_limiter.success()
+                if stream and held:
+                    # Only the headers are in: the transfer still counts against the concurrency limit
+                    response.rate_limiter, held = rate_limiter, False
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            error = HTTPError(f"{response.status_code} Error for url: {response.url}", response=response)
+            response.close()
+        except HTTPError:
+            report.count("failed_requests")
+            raise
+        except RequestException as e:
+            error = e
+        finally:
+            if held:
+                rate_limiter.release()
+
+        if rate_limiter is not None:
+            rate_limiter.throttle(retry_after)
+        if attempt == max_retries - 1:  # Last attempt
+            report.count("failed_requests")
+            raise error
+        report.count("retries")
+        wait_time = retry_after if retry_after is not None else min(2 ** attempt, max_backoff) * random.uniform(1, 2)
+        print(f"Request failed ({str(error)}), retrying in {wait_time:.1f} seconds... "
+              f"(Attempt {attempt + 1}/{max_retries})")
+        time.sleep(wait_time)
+
+def zstd_writer(f):
+    """Multithreaded zstd stream writer over an open binary file, leaving the file open"""
+    if zstandard is None:
+        raise ImportError("Storing MAFs as zstd requires the zstandard package")
+    return zstandard.ZstdCompressor(level=zstd_level, threads=-1).stream_writer(f, closefd=False)
+
+def write_chunks(chunks, output_file, decompress=False, md5sum=None, recompress=None):
+    """Write an iterable of byte chunks to disk, optionally gunzipping on the fly.
+
+    The data goes to a temporary file next to the target which is renamed into
+    place only once complete, so an interrupted run never leaves a partial file.
+    If md5sum is given, the input bytes are hashed as they stream past and the
+    file is discarded with a ValueError when they do not match. With
+    recompress="zstd" the gzip input is decompressed and written as zstd.
+    Returns the number of bytes consumed from the input.
+    """
+    if recompress not in (None, "zstd"):
+        raise ValueError(f"Unknown compression {recompress}")
+    decompress = decompress or recompress is not None
+    temp_file = output_file + ".part"
+    nbytes = 0
+    md5 = hashlib.md5()
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        with open(temp_file, 'wb') as raw:
+            f = zstd_writer(raw) if recompress == "zstd" else raw
+            for chunk in chunks:
+                nbytes += len(chunk)
+                if md5sum:
+                    md5.update(chunk)
+                if not decompress:
+                    f.write(chunk)
+                    continue
+                while chunk:
+                    f.write(decompressor.decompress(chunk))
+                    # Concatenated gzip members: restart on the leftover bytes
+                    chunk = decompressor.unused_data
+                    if decompressor.eof:
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    else:
+                        chunk = b""
+            if decompress:
+                f.write(decompressor.flush())
+            if f is not raw:
+                f.close()  # ends the zstd frame
+        if md5sum and md5.hexdigest() != md5sum:
+            raise ValueError(f"md5 mismatch for {output_file}: expected {md5sum}, got {md5.hexdigest()}")
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    report.count("files_written")
+    report.count("bytes_downloaded", nbytes)
+    report.count("bytes_written", os.path.getsize(output_file))
+    return nbytes
+
+def close_response(response):
+    """Close a streamed response and give back the rate limiter slot it holds, if any"""
+    try:
+        response.close()
+    finally:
+        rate_limiter = getattr(response, "rate_limiter", None)
+        if rate_limiter is not None:
+            response.rate_limiter = None
+            rate_limiter.release()
+
+def stream_to_file(response, output_file, decompress=False, md5sum=None, recompress=None):
+    """Stream a response body to disk and return the number of bytes fetched"""
+    try:
+        return write_chunks(response.iter_content(chunk_size=chunk_size), output_file, decompress, md5sum,
+                            recompress)
+    finally:
+        close_response(response)
+
+def batched(items, batch_size):
+    """Split a list into consecutive batches of at most batch_size items"""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+def iter_archive(file_ids, session=None, rate_limiter=None):
+    """POST a batch of file IDs to /data and yield (file_id, file_name, fileobj) per member.
+
+    The GDC packs the requested files into one tar.gz whose members are named
+    "{file_id}/{file_name}", next to a MANIFEST.txt at the top level.
+    """
+    response = make_request_with_retry(
+        data_endpt.rstrip("/"),
+        headers={"Content-Type": "application/json"},
+        session=session,
+        rate_limiter=rate_limiter,
+        stream=True,
+        method="POST",
+        json={"ids": list(file_ids)}
+    )
+    try:
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode="r|*") as tar:
+            for member in tar:
+                parts = member.name.split('/')
+                if not member.isfile() or len(parts) != 2:
+                    continue
+                yield parts[0], parts[1], tar.extractfile(member)
+    finally:
+        close_response(response)
+
+def read_chunks(fileobj):
+    """Iterate over a file object in chunk_size pieces"""
+    return iter(lambda: fileobj.read(chunk_size), b"")
+
+def download_file(hit, output_file, session=None, rate_limiter=None, **write_options):
+    """GET one file from /data and stream it to output_file, returning the number of bytes fetched"""
+    response = make_request_with_retry(
+        f"{data_endpt}{hit['file_id']}",
+        headers={"Content-Type": "application/json"},
+        session=session,
+        rate_limiter=rate_limiter,
+        stream=True
+    )
+    return stream_to_file(response, output_file, md5sum=hit.get("md5sum"), **write_options)
+
+def download_batch(hits, output_file, on_done, on_failed, session=None, rate_limiter=None, **write_options):
+    """Fetch a batch of files as one /data archive, falling back to single GETs for what it missed.
+
+    output_file(hit) gives the path of each file and write_options (decompress,
+    recompress) are passed on to write_chunks, which checks the md5 of every
+    file. on_done(hit, path, nbytes) or on_failed(hit, path, error) is called
+    once per hit.
+    """
+    remaining = {hit["file_id"]: hit for hit in hits}
+    if len(hits) > 1:
+        try:
+            for file_id, file_name, member in iter_archive(remaining, session, rate_limiter):
+                # A hit leaves remaining only once written, so a member cut off by a dropped
+                # connection or truncated archive is retried by the single-file fallback below
+                hit = remaining.get(file_id)
+                if hit is None:
+                    continue
+                path = output_file(hit)
+                try:
+                    nbytes = write_chunks(read_chunks(member), path, md5sum=hit.get("md5sum"), **write_options)
+                except ValueError as e:
+                    # Checksum mismatch: leave it to the single-file fallback below
+                    print(f"{hit['file_name']}: {str(e)}")
+                    continue
+                del remaining[file_id]
+                on_done(hit, path, nbytes)
+        except Exception as e:
+            print(f"Batch download failed ({str(e)}), falling back to single-file downloads for "
+                  f"{len(remaining)} files")
+
+    for hit in remaining.values():
+        path = output_file(hit)
+        try:
+            nbytes = download_file(hit, path, session, rate_limiter, **write_options)
+        except Exception as e:
+            on_failed(hit, path, e)
+            continue
+        on_done(hit, path, nbytes)
+
+def query_cache_file(endpt, filters, fields):
+    """Path of the cache file for a query, keyed by a hash of the query itself"""
+    key = json.dumps({"endpt": endpt, "filters": filters, "fields": fields}, sort_keys=True)
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+def query_page(endpt, filters, fields, offset, size, session=None):
+    """Fetch one page of hits and the pagination block of a metadata query"""
+    params = {
+        "filters": json.dumps(filters),
+        "fields": fields,
+        "format": "JSON",
+        "size": str(size),
+        "from": str(offset)
+    }
+    response = make_request_with_retry(endpt, params=params, session=session)
+    data = json.loads(response.content.decode("utf-8"))["data"]
+    report.count("query_pages")
+    return data["hits"], data["pagination"]
+
+def query_hits(endpt, filters, fields, size=page_size, workers=4, ttl=cache_ttl, session=None):
+    """Return every hit of a metadata query, following pagination and caching the result.
+
+    The first page tells us the total, the remaining pages are fetched in
+    parallel. Results are written to cache_dir and reused for ttl seconds;
+    ttl=None always reuses the cache (offline), ttl=0 always refreshes it.
+    """
+    cache_file = query_cache_file(endpt, filters, fields)
+    if ttl != 0 and os.path.exists(cache_file):
+        if ttl is None or time.time() - os.path.getmtime(cache_file) < ttl:
+            with open(cache_file) as f:
+                report.count("query_cache_hits")
+                return json.load(f)["hits"]
+
+    if session is None:
+        session = get_session()
+    hits, pagination = query_page(endpt, filters, fields, 0, size, session)
+    offsets = range(len(hits), pagination["total"], size)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        pages = executor.map(lambda offset: query_page(endpt, filters, fields, offset, size, session)[0], offsets)
+        for page in pages:
+            hits.extend(page)
+    if len(hits) != pagination["total"]:
+        print(f"Warning: expected {pagination['total']} hits but received {len(hits)}")
+
+    # Written atomically but not through write_chunks, which counts downloaded files for the run report
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_file = cache_file + ".part"
+    with open(temp_file, "w") as f:
+        json.dump({"filters": filters, "fields": fields, "hits": hits}, f)
+    os.replace(temp_file, cache_file)
+    return hits
+
+def query_files(filters, fields, **kwargs):
+    """Return every file matching filters from the /files endpoint"""
+    return query_hits(files_endpt, filters, fields, **kwargs)
+
+def query_cases(filters, fields, **kwargs):
+    """Return every case matching filters from the /cases endpoint"""
+    return query_hits(cases_endpt, filters, fields, **kwargs)
@@ -0,0 +1,117 @@
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / 1e6 if sys.platform == "darwin" else peak / 1e3, 1)
+
+class RunReport:
+    """Per-stage timers and counters of one run.
+
+    Stages are opened with `with report.stage("download"):` and may nest;
+    count() adds to the innermost open stage (from any thread) as well as to
+    the run totals. A stage entered twice accumulates. write() saves the
+    report as JSON or CSV depending on the file extension.
+    """
+    def __init__(self, name="run"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.open_stages = []
+
+    @contextmanager
+    def stage(self, name):
+        with self.lock:
+            record = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "counters": {}})
+            self.open_stages.append(name)
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            with self.lock:
+                record["seconds"] += time.perf_counter() - start_time
+                record["calls"] += 1
+                record["peak_rss_mb"] = peak_rss_mb()
+                self.open_stages.remove(name)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self.open_stages:
+                counters = self.stages[self.open_stages[-1]]["counters"]
+                counters[name] = counters.get(name, 0) + n
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "seconds": round(time.perf_counter() - self.start_time, 3),
+                "peak_rss_mb": peak_rss_mb(),
+                "counters": dict(self.counters),
+                "stages": [
+                    {"stage": name, "seconds": round(record["seconds"], 3), "calls": record["calls"],
+                     "peak_rss_mb": record.get("peak_rss_mb"), **record["counters"]}
+                    for name, record in self.stages.items()
+                ],
+            }
+
+    def summary(self):
+        data = self.to_dict()
+        print(f"{data['name']}: {data['seconds']:.1f} s, peak RSS {data['peak_rss_mb']} MB")
+        for stage in data["stages"]:
+            counters = {k: v for k, v in stage.items() if k not in ("stage", "seconds", "calls", "peak_rss_mb")}
+            print(f"  {stage['stage']:<20} {stage['seconds']:8.2f} s  "
+                  + ", ".join(f"{k}={v}" for k, v in counters.items()))
+
+    def write(self, path):
+        """Save the report as JSON, or as one CSV row per stage if path ends in .csv"""
+        data = self.to_dict()
+        if path.endswith(".csv"):
+            columns = ["stage", "seconds", "calls", "peak_rss_mb"]
+            for stage in data["stages"]:
+                columns += [k for k in stage if k not in columns]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(data["stages"])
+        else:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+
+    def reset(self, name="run"):
+        self.__init__(name)
+
+@contextmanager
+def profile(path=None):
+    """Run the block under cProfile and dump the stats to path; does nothing if path is None"""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiler.dump_stats(path)
+
+# Shared by gdc_api, mutation_store and the scripts so counters need no extra arguments
+report = RunReport()
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use('Agg')  # worker processes have no display
+from cancer_types import cancer_types, clinical_file, cohort_landscapes
+from mutation_landscape import (read_clinical_table, filter_cases, read_maf_files, create_mutation_landscape,
+                                plot_format)
+from shared_mutations import MutationDataset, update_dataset, dataset_dir
+
+# Batch settings
+n_workers = os.cpu_count() or 1  # cohorts drawn in parallel
+top_n_genes = 30
+output_dir = "landscapes"
+summary_file = "run_summary.json"
+use_dataset = True  # workers attach to the memory-mapped mutation dataset instead of parsing MAFs (shared_mutations.py)
+
+def run_cohort(cohort, output_dir=output_dir, top_n_genes=top_n_genes, dataset=None):
+    """Draw every landscape of one cohort, reading its clinical and mutation data once.
+
+    All diagnoses of a cohort are cut from the same parsed clinical table and
+    MAF table. The MAF table is sliced from the shared dataset directory if one
+    is given, else parsed. Returns a summary with the per-step timings of the cohort.
+    """
+    start_time = time.perf_counter()
+    clinical = read_clinical_table(clinical_file(cohort))
+    cases = {diagnosis: filter_cases(clinical, include) for diagnosis, include in cohort_landscapes(cohort)}
+    all_cases = sorted(set().union(*cases.values()))
+    if dataset is not None:
+        shared = MutationDataset(dataset)
+        if cohort not in shared.cohorts:
+            raise ValueError(f"{cohort} is not in the mutation dataset {dataset}")
+        # The cohort stays a view of the shared maps, each landscape below copies only its own rows
+        mutations = shared.frame(cohort)
+        sample_cases = mutations['case_id']
+        if not sample_cases.isin(all_cases).any():
+            raise ValueError("No matching MAF files found for the filtered cases")
+    else:
+        # MAFs are parsed serially here: the parallelism is across cohorts
+        mutations = read_maf_files("data_snv_" + cohort, all_cases, cohort, workers=1)
+        # Tumor_Sample_Barcode starts with the 12 character case ID (TCGA-XX-XXXX)
+        sample_cases = mutations['Tumor_Sample_Barcode'].astype(str).str[:12]
+    read_time = time.perf_counter()
+
+    landscapes = []
+    for diagnosis, case_ids in cases.items():
+        output_file = os.path.join(output_dir, f"{cohort}_{diagnosis.replace(' ', '_')}.{plot_format}")
+        create_mutation_landscape(mutations[sample_cases.isin(case_ids)], output_file, top_n_genes, title=diagnosis)
+        landscapes.append({"diagnosis": diagnosis, "cases": len(case_ids), "output_file": output_file})
+    end_time = time.perf_counter()
+
+    return {
+        "cohort": cohort,
+        "status": "done",
+        "cases": len(all_cases),
+        "mutations": int(sample_cases.isin(all_cases).sum()),
+        "landscapes": landscapes,
+        "read_seconds": round(read_time - start_time, 3),
+        "plot_seconds": round(end_time - read_time, 3),
+        "seconds": round(end_time - start_time, 3),
+    }
+
+def run_batch(cohorts=None, workers=n_workers, output_dir=output_dir, top_n_genes=top_n_genes,
+              dataset=dataset_dir if use_dataset else None):
+    """Draw the landscapes of many cohorts in worker processes and write a run summary.
+
+    With a dataset directory the mutations are loaded once into the shared
+    dataset (rebuilt first for cohorts whose MAFs changed) and every worker
+    attaches to it instead of parsing MAFs.
+    """
+    if cohorts is None:
+        cohorts = list(cancer_types)
+    os.makedirs(output_dir, exist_ok=True)
+    if dataset is not None:
+        update_dataset(list(cancer_types), dataset)
+
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(run_cohort, cohort, output_dir, top_n_genes, dataset): cohort
+                   for cohort in cohorts}
+        for future in as_completed(futures):
+            cohort = futures[future]
+            try:
+                result = future.result()
+                print(f"{cohort}: {len(result['landscapes'])} landscapes in {result['seconds']:.1f} s")
+            except Exception as e:
+                result = {"cohort": cohort, "status": "failed", "error": str(e)}
+                print(f"{cohort}: failed ({str(e)})")
+            results.append(result)
+
+    summary = {
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "workers": workers,
+        "cohorts": sorted(results, key=lambda result: result["cohort"]),
+    }
+    with open(os.path.join(output_dir, summary_file), "w") as f:
+        json.dump(summary, f, indent=2)
+    failed = [result["cohort"] for result in results if result["status"] == "failed"]
+    print(f"Drew {len(results) - len(failed)}/{len(results)} cohorts in {summary['seconds']:.1f} s")
+    return summary
+
+if __name__ == "__main__":
+    run_batch()
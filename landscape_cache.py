@@ -0,0 +1,98 @@
+import os
+import json
+import pandas as pd
+from mutation_store import (has_cohort, is_stale, load_mutations, maf_case_files, read_mafs, report_maf_summary,
+                            maf_cols, n_workers)
+from mutation_matrix import SparseMutationMatrix
+
+# Cache settings
+cache_dir = "data_landscape_cache"  # per-cohort landscape aggregates and the MAF signatures they were built from
+cell_cols = ['case_id', 'Hugo_Symbol', 'Tumor_Sample_Barcode', 'count', 'code']
+
+def cache_files(cohort, directory=cache_dir):
+    """Paths of the aggregate table and the signature file of a cohort"""
+    return os.path.join(directory, f"{cohort}.parquet"), os.path.join(directory, f"{cohort}.sources.json")
+
+def case_signature(maf_file):
+    return [maf_file, os.path.getsize(maf_file), os.path.getmtime(maf_file)]
+
+def aggregate_cells(mutations, priority_order):
+    """Reduce MAF rows to one row per (case, gene, sample) with the mutation count and most severe code"""
+    priority_rank = {mut_type: rank for rank, mut_type in enumerate(priority_order)}
+    codes = mutations['Variant_Classification'].map(priority_rank).astype(float)
+    mutations = mutations[codes.notna()].assign(code=codes[codes.notna()].astype(int), count=1)
+    cells = mutations.groupby(['case_id', 'Hugo_Symbol', 'Tumor_Sample_Barcode'], observed=True, as_index=False).agg(
+        count=('count', 'sum'), code=('code', 'min'))
+    # Plain strings so that cached and newly parsed rows concatenate cleanly
+    return cells[cell_cols].astype({'case_id': str, 'Hugo_Symbol': str, 'Tumor_Sample_Barcode': str})
+
+def update_cohort_cells(snv_dir, cohort, priority_order, directory=cache_dir, workers=n_workers):
+    """Bring the cached aggregates of a cohort in line with its MAFs, parsing only new or changed cases.
+
+    Cases are keyed by MAF path, size and mtime; rows of removed or changed
+    cases are dropped and the new MAFs are aggregated, taken from the mutation
+    store when its partition is up to date and parsed otherwise. A change of
+    priority_order rebuilds everything. The case IDs with a MAF and those whose
+    MAF has no rows are kept in the result's attrs["cases"] and attrs["empty"].
+    """
+    cells_file, signature_file = cache_files(cohort, directory)
+    signatures = {case_id: case_signature(maf_file) for case_id, maf_file in maf_case_files(snv_dir).items()}
+
+    cells = pd.DataFrame(columns=cell_cols)
+    old_signatures, empty = {}, []
+    if os.path.exists(cells_file) and os.path.exists(signature_file):
+        with open(signature_file) as f:
+            cached = json.load(f)
+        if cached["priority_order"] == list(priority_order) and "empty" in cached:
+            old_signatures, empty = cached["cases"], cached["empty"]
+            cells = pd.read_parquet(cells_file)
+
+    changed = [case_id for case_id, signature in signatures.items() if old_signatures.get(case_id) != signature]
+    removed = [case_id for case_id in old_signatures if case_id not in signatures]
+    if changed or removed:
+        print(f"{cohort}: {len(changed)} new or changed cases, {len(removed)} removed")
+        cells = cells[~cells['case_id'].isin(changed + removed)]
+        empty = [case_id for case_id in empty if case_id not in changed and case_id not in removed]
+        if changed:
+            if has_cohort(cohort) and not is_stale(snv_dir, cohort):
+                mutations = load_mutations(cohort, changed, columns=maf_cols + ['case_id'])
+                found = set(mutations['case_id'])
+                new_empty = [case_id for case_id in changed if case_id not in found]
+            else:
+                mutations, new_empty = read_mafs({case_id: signatures[case_id][0] for case_id in changed}, maf_cols,
+                                                 workers)
+            empty = sorted(empty + new_empty)
+            cells = pd.concat([cells, aggregate_cells(mutations, priority_order)], ignore_index=True)
+        cells = cells.astype({'count': int, 'code': int})
+
+        os.makedirs(directory, exist_ok=True)
+        cells.to_parquet(cells_file, index=False)
+        with open(signature_file, "w") as f:
+            json.dump({"priority_order": list(priority_order), "cases": signatures, "empty": empty}, f)
+
+    cells.attrs["cases"] = sorted(signatures)
+    cells.attrs["empty"] = empty
+    return cells
+
+def cohort_matrix(snv_dir, cohort, priority_order, case_ids=None, directory=cache_dir, workers=n_workers):
+    """SparseMutationMatrix of a cohort (optionally only some cases) from the incrementally updated cache.
+
+    Missing and empty cases are summarised as by read_maf_files, printed and
+    kept in the matrix's attrs["maf_summary"].
+    """
+    cells = update_cohort_cells(snv_dir, cohort, priority_order, directory, workers)
+    cases, empty = set(cells.attrs["cases"]), set(cells.attrs["empty"])
+    if case_ids is None:
+        case_ids = sorted(cases)
+    summary = {"requested": len(case_ids), "loaded": 0,
+               "missing": [case_id for case_id in case_ids if case_id not in cases],
+               "empty": [case_id for case_id in case_ids if case_id in empty]}
+    summary["loaded"] = summary["requested"] - len(summary["missing"]) - len(summary["empty"])
+    report_maf_summary(summary)
+
+    cells = cells[cells['case_id'].isin(case_ids)]
+    if len(cells) == 0:
+        raise ValueError("No matching MAF files found for the filtered cases")
+    matrix = SparseMutationMatrix.from_cells(cells)
+    matrix.attrs["maf_summary"] = summary
+    return matrix
@@ -0,0 +1,137 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from mutation_store import count_header_lines, maf_cols, n_workers
+from mutation_matrix import SparseMutationMatrix
+from instrumentation import report
+
+chunk_rows = 200000  # MAF rows parsed at a time
+compact_rows = 1000000  # parsed rows buffered before they are folded into the counters
+
+class MafAggregator:
+    """Running per-sample and per-(gene, sample) counters over MAF chunks.
+
+    Only aggregates are kept: the number of mutations and of non-silent ones
+    per sample (tumour mutation burden), and the mutation count and most
+    severe code (index into priority_order) per mutated (gene, sample). Parsed
+    rows are buffered up to compact_rows and then folded in with one groupby,
+    so memory is bounded by that buffer plus the distinct genes and samples.
+    """
+    def __init__(self, priority_order):
+        self.priority_order = list(priority_order)
+        self.priority_rank = {mut_type: rank for rank, mut_type in enumerate(self.priority_order)}
+        self._burden = pd.DataFrame(columns=['mutations', 'nonsilent'], dtype='int64')
+        self._cells = pd.DataFrame(columns=['count', 'code'], dtype='int64')
+        self.pending = []  # parsed chunks not folded in yet
+        self.pending_rows = 0
+        self.rows = 0
+
+    def add(self, chunk):
+        """Buffer one chunk of MAF rows, folding the buffer in once it is large enough"""
+        self.rows += len(chunk)
+        self.pending.append(chunk[['Hugo_Symbol', 'Variant_Classification', 'Tumor_Sample_Barcode']])
+        self.pending_rows += len(chunk)
+        if self.pending_rows >= compact_rows:
+            self.compact()
+
+    def compact(self):
+        """Fold the buffered rows into the burden and cell counters"""
+        if not self.pending:
+            return
+        rows = pd.concat(self.pending, ignore_index=True)
+        self.pending, self.pending_rows = [], 0
+
+        codes = rows['Variant_Classification'].map(self.priority_rank)
+        nonsilent = codes.notna() & (rows['Variant_Classification'] != 'Silent')
+        burden = pd.DataFrame({'mutations': 1, 'nonsilent': nonsilent.astype('int64')}).groupby(
+            rows['Tumor_Sample_Barcode']).sum()
+        self._burden = burden.add(self._burden, fill_value=0).astype('int64')
+
+        ranked = rows[codes.notna()].assign(code=codes[codes.notna()].astype('int64'), count=1)
+        cells = ranked.groupby(['Hugo_Symbol', 'Tumor_Sample_Barcode']).agg(count=('count', 'sum'),
+                                                                            code=('code', 'min'))
+        self.merge_cells(cells)
+
+    def merge_cells(self, cells):
+        if len(self._cells) == 0:
+            self._cells = cells
+            return
+        combined = pd.concat([self._cells, cells])
+        self._cells = combined.groupby(level=[0, 1]).agg({'count': 'sum', 'code': 'min'})
+
+    def merge(self, other):
+        """Fold the counters of another aggregator (e.g. from a worker process) into this one"""
+        self.compact()
+        self.rows += other.rows
+        self._burden = other.burden.add(self._burden, fill_value=0).astype('int64')
+        self.merge_cells(other.cells)
+        return self
+
+    @property
+    def burden(self):
+        """Mutations and non-silent mutations per sample"""
+        self.compact()
+        return self._burden
+
+    @property
+    def cells(self):
+        """Mutation count and most severe code per mutated (gene, sample)"""
+        self.compact()
+        return self._cells
+
+    def gene_samples(self):
+        """Number of samples in which each gene carries a priority_order mutation"""
+        return self.cells.groupby(level=0).size().sort_values(ascending=False)
+
+    def matrix(self):
+        """SparseMutationMatrix of the aggregated cells, ready for create_mutation_landscape"""
+        return SparseMutationMatrix.from_cells(self.cells.reset_index())
+
+def aggregate_maf(maf_file, aggregator, chunksize=chunk_rows):
+    """Stream one MAF into an aggregator chunk by chunk"""
+    reader = pd.read_csv(maf_file, sep='\t', skiprows=count_header_lines(maf_file), usecols=maf_cols, dtype=str,
+                         chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            aggregator.add(chunk)
+    return aggregator
+
+def aggregate_files(maf_files, priority_order, chunksize=chunk_rows):
+    """Aggregate a group of MAFs in one process, returning only the counters"""
+    aggregator = MafAggregator(priority_order)
+    for maf_file in maf_files:
+        aggregate_maf(maf_file, aggregator, chunksize)
+    aggregator.compact()
+    return aggregator
+
+def aggregate_mafs(case_files, priority_order, workers=n_workers, chunksize=chunk_rows):
+    """Aggregate many MAFs out of core, splitting the files over worker processes.
+
+    case_files maps case IDs to MAF paths (as from mutation_store.maf_case_files).
+    Each worker returns its counters, which are merged here; no worker ever
+    buffers more than compact_rows mutation rows.
+    """
+    maf_files = list(case_files.values())
+    if not maf_files:
+        raise ValueError("No MAF files to aggregate")
+    workers = max(min(workers, len(maf_files)), 1)
+    groups = [maf_files[i::workers] for i in range(workers)]
+    if workers == 1:
+        aggregators = [aggregate_files(groups[0], priority_order, chunksize)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            aggregators = list(executor.map(aggregate_files, groups, [priority_order] * workers,
+                                            [chunksize] * workers))
+
+    aggregator = aggregators[0]
+    for other in aggregators[1:]:
+        aggregator.merge(other)
+    report.count("files_parsed", len(maf_files))
+    report.count("rows", aggregator.rows)
+    return aggregator
+
+def write_burden(aggregator, output_file):
+    """Save per-sample mutation burden as a TSV"""
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    aggregator.burden.rename_axis('Tumor_Sample_Barcode').sort_values('mutations', ascending=False).to_csv(
+        output_file, sep='\t')
@@ -0,0 +1,245 @@
+import io
+import sys
+import gzip
+import json
+import time
+import random
+import socket
+import struct
+import fnmatch
+import hashlib
+import tarfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Mock server settings
+port = 8765
+n_cases = 200
+cohorts = ['PAAD', 'BRCA', 'LUAD']
+latency = 0.0  # seconds added to every response
+error_rate = 0.0  # share of requests answered with a 503
+reset_rate = 0.0  # share of requests whose connection is reset without a response
+retry_after = None  # Retry-After seconds sent with the injected 503s
+mutations_per_file = 50
+
+def make_catalog(n_cases=n_cases, cohorts=cohorts, seed=0):
+    """Synthetic GDC file records (nested like the real /files hits) and their gzip payloads"""
+    rng = random.Random(seed)
+    records, payloads = [], {}
+    for i in range(n_cases):
+        cohort = cohorts[i % len(cohorts)]
+        case_id = f"TCGA-{cohort[:2]}-{i:04d}"
+        sample = f"{case_id}-01A-11D-A000-08"
+
+        file_id = f"{i:08d}-0000-4000-8000-{hashlib.md5(case_id.encode()).hexdigest()[:12]}"
+        lines = ["#version 2.4", "Hugo_Symbol\tVariant_Classification\tTumor_Sample_Barcode"]
+        for _ in range(mutations_per_file):
+            lines.append(f"GENE{rng.randint(0, 500)}\tMissense_Mutation\t{sample}")
+        payload = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        payloads[file_id] = payload
+        records.append({
+            "file_id": file_id,
+            "file_name": f"{file_id}.wxs.aliquot_ensemble_masked.maf.gz",
+            "md5sum": hashlib.md5(payload).hexdigest(),
+            "file_size": len(payload),
+            "data_type": "Masked Somatic Mutation",
+            "cases": [{"submitter_id": case_id, "project": {"project_id": f"TCGA-{cohort}"}}],
+        })
+    return records, payloads
+
+def field_values(record, field):
+    """All values reached by a dotted field path, descending into lists"""
+    values = [record]
+    for key in field.split("."):
+        next_values = []
+        for value in values:
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, dict) and key in item:
+                    next_values.append(item[key])
+        values = next_values
+    return [item for value in values for item in (value if isinstance(value, list) else [value])]
+
+def matches(record, filters):
+    """Evaluate a GDC filter ("and", "or", "=", "in", "like") against a record"""
+    if not filters:
+        return True
+    op, content = filters["op"], filters["content"]
+    if op == "and":
+        return all(matches(record, f) for f in content)
+    if op == "or":
+        return any(matches(record, f) for f in content)
+    accepted = content["value"] if isinstance(content["value"], list) else [content["value"]]
+    values = [str(value) for value in field_values(record, content["field"])]
+    # The GDC treats "*" as a wildcard for "=" and "like" alike
+    return any(fnmatch.fnmatchcase(value, str(pattern)) for value in values for pattern in accepted)
+
+def project(record, fields):
+    """Keep only the requested (dotted) fields of a record"""
+    def pick(value, path):
+        if isinstance(value, list):
+            return [pick(item, path) for item in value]
+        key, rest = path[0], path[1:]
+        if not isinstance(value, dict) or key not in value:
+            return {}
+        return {key: pick(value[key], rest) if rest else value[key]}
+
+    def merge(a, b):
+        if isinstance(a, list):
+            return [merge(x, y) for x, y in zip(a, b)]
+        for key, value in b.items():
+            a[key] = merge(a[key], value) if key in a and isinstance(value, (dict, list)) else value
+        return a
+
+    result = {"id": record["file_id"]}
+    for field in fields:
+        result = merge(result, pick(record, field.split(".")))
+    return result
+
+class MockGDCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def inject_faults(self):
+        """Apply latency, then maybe reset the connection or answer 503. Returns True if handled."""
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        roll = server.rng.random()
+        if roll < server.reset_rate:
+            with server.lock:
+                server.stats["resets"] += 1
+            # SO_LINGER 0 makes close() send a TCP RST
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            return True
+        if roll < server.reset_rate + server.error_rate:
+            with server.lock:
+                server.stats["errors"] += 1
+            headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+            self.send_body(503, b'{"message": "Service Unavailable"}', "application/json", headers)
+            return True
+        return False
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.stats["bytes"] += len(body)
+
+    def do_GET(self):
+        if self.inject_faults():
+            return
+        url = urlparse(self.path)
+        if url.path.rstrip("/") == "/files":
+            self.handle_files(parse_qs(url.query))
+        elif url.path.startswith("/data/"):
+            file_id = url.path[len("/data/"):]
+            payload = self.server.payloads.get(file_id)
+            if payload is None:
+                self.send_body(404, b'{"message": "File not found"}', "application/json")
+            else:
+                self.send_body(200, payload, "application/octet-stream")
+        else:
+            self.send_body(404, b'{"message": "Not found"}', "application/json")
+
+    def do_POST(self):
+        if self.inject_faults():
+            return
+        if urlparse(self.path).path.rstrip("/") != "/data":
+            self.send_body(404, b'{"message": "Not found"}', "application/json")
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        file_ids = json.loads(self.rfile.read(length) or b"{}").get("ids", [])
+        self.send_body(200, self.server.archive(file_ids), "application/x-tar")
+
+    def handle_files(self, query):
+        filters = json.loads(query.get("filters", ["{}"])[0] or "{}")
+        fields = [f for f in query.get("fields", [""])[0].split(",") if f]
+        size = int(query.get("size", ["10"])[0])
+        offset = int(query.get("from", ["0"])[0])
+        hits = [record for record in self.server.records if matches(record, filters)]
+        page = [project(record, fields) for record in hits[offset:offset + size]]
+        body = {
+            "data": {
+                "hits": page,
+                "pagination": {"count": len(page), "total": len(hits), "size": size, "from": offset,
+                               "page": offset // max(size, 1) + 1, "pages": -(-len(hits) // max(size, 1))},
+            },
+            "warnings": {},
+        }
+        self.send_body(200, json.dumps(body).encode("utf-8"), "application/json")
+
+class MockGDCServer(ThreadingHTTPServer):
+    """Local stand-in for the GDC /files and /data endpoints with injectable faults.
+
+    Serves a synthetic catalog of gzipped MAFs. Every request first waits
+    latency seconds, then is reset with probability reset_rate or answered with
+    a 503 (with retry_after as its Retry-After, if set) with probability
+    error_rate. stats counts requests, injected faults
+    and bytes served. Point the downloaders at it with GDC_API_URL=server.url.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=port, n_cases=n_cases, latency=latency, error_rate=error_rate, reset_rate=reset_rate,
+                 retry_after=retry_after, seed=0):
+        super().__init__(("127.0.0.1", port), MockGDCHandler)
+        self.records, self.payloads = make_catalog(n_cases, seed=seed)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "resets": 0, "bytes": 0}
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def archive(self, file_ids):
+        """tar.gz of "{file_id}/{file_name}" members plus MANIFEST.txt, like POST /data"""
+        names = {record["file_id"]: record["file_name"] for record in self.records}
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            manifest = "id\tfilename\tmd5\tsize\tstate\n"
+            for file_id in file_ids:
+                if file_id not in self.payloads:
+                    continue
+                payload = self.payloads[file_id]
+                info = tarfile.TarInfo(f"{file_id}/{names[file_id]}")
+                info.size = len(payload)
+                tar.addfile(info, io.BytesIO(payload))
+                manifest += f"{file_id}\t{names[file_id]}\t{hashlib.md5(payload).hexdigest()}\t{len(payload)}\tlive\n"
+            info = tarfile.TarInfo("MANIFEST.txt")
+            info.size = len(manifest.encode("utf-8"))
+            tar.addfile(info, io.BytesIO(manifest.encode("utf-8")))
+        return buffer.getvalue()
+
+    def start(self):
+        """Serve in a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    server = MockGDCServer(int(sys.argv[1]) if len(sys.argv) > 1 else port)
+    print(f"Mock GDC API on {server.url} ({len(server.records)} files); use GDC_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -1,17 +1,31 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
 import seaborn as sns
-from collections import defaultdict
 import os
+from mutation_store import (has_cohort, is_stale, load_mutations, partition_cases, read_mafs, report_maf_summary,
+                            maf_suffixes, n_workers)
+from mutation_matrix import SparseMutationMatrix
+from landscape_cache import cohort_matrix
+from instrumentation import report, profile
+from cooccurrence import cooccurrence_table
+from sample_metadata import load_sample_metadata, select_aliquots, filter_mutations
+from maf_aggregate import aggregate_mafs, write_burden
 
 # TCGA settings
 tcga_cancer = "Pancreatic Ductal Adenocarcinoma"
 tcga_clinical = os.path.join("data_clinical", "nationwidechildrens.org_clinical_patient_paad.txt")
-tcga_snv_dir = 'data_snv_PAAD'
+tcga_cohort = 'PAAD'
+tcga_snv_dir = 'data_snv_' + tcga_cohort
 tcga_include = {
     'histologic_diagnosis': ["Pancreas-Adenocarcinoma Ductal Type"],
 }
+tcga_sample_types = None  # e.g. ["Primary Tumor"] to drop metastatic/recurrent samples (sample_metadata.py)
+use_cache = True  # build the landscape from incrementally updated per-cohort aggregates (landscape_cache.py)
+stream_mafs = False  # without the cache, aggregate MAFs chunk by chunk instead of loading all rows (maf_aggregate.py)
+report_file = None  # write the per-stage run report here (.json or .csv)
+profile_file = None  # dump cProfile stats of the run here
 
 # Plot settings remain the same as before
 plt.style.use('ggplot')
@@ -20,6 +34,8 @@ plot_size = (7.0, 3.5)
 plot_dpi = 600
 plot_fontsize = 6
 gene_fontsize = 6
+plot_raster = True  # draw the mutation cells as one image instead of one patch per cell
+write_cooccurrence = True  # save pairwise co-occurrence / exclusivity tests of the plotted genes next to the plot
 
 # Mutation type mapping remains the same
 mutation_categories = {
@@ -35,6 +51,11 @@ mutation_categories = {
     'Silent': ('Synonymous', '#d2dae2'),
 }
 
+# Most severe first: a sample with several mutations in one gene is shown as the first of these
+priority_order = ['Nonsense_Mutation', 'Frame_Shift_Del', 'Frame_Shift_Ins',
+                  'Splice_Site', 'Translation_Start_Site', 'Nonstop_Mutation',
+                  'In_Frame_Del', 'In_Frame_Ins', 'Missense_Mutation', 'Silent']
+
 def read_clinical_data(clinical_file, include_histology_dict):
     """Read clinical data and filter based on multiple histology columns.
     
@@ -45,9 +66,15 @@ def read_clinical_data(clinical_file, include_histology_dict):
     Returns:
         list: List of case IDs meeting the histology criteria
     """
+    return filter_cases(read_clinical_table(clinical_file), include_histology_dict)
+
+def read_clinical_table(clinical_file):
+    """Read a clinical_patient file, skipping its two extra header rows."""
     # Read the file with the first row as header, skip the 2nd and 3rd rows
-    df = pd.read_csv(clinical_file, sep='\t', skiprows=[1,2])
-    
+    return pd.read_csv(clinical_file, sep='\t', skiprows=[1,2])
+
+def filter_cases(df, include_histology_dict):
+    """Return the case IDs of a clinical table matching any of the included histologies."""
     # Create mask for each histology column
     masks = []
     for col, values in include_histology_dict.items():
@@ -65,148 +92,241 @@ def read_clinical_data(clinical_file, include_histology_dict):
     return filtered_df.iloc[:, 1].tolist()
 
 # Rest of the code remains unchanged
-def read_maf_files(directory, case_ids):
-    """Read MAF files for specific cases."""
-    all_mutations = []
-    
+def find_maf_files(directory, case_ids):
+    """MAF path of every case that has one in directory, plus the cases that have none"""
+    case_files, missing = {}, []
     for case_id in case_ids:
-        maf_file = os.path.join(directory, f"{case_id}.maf")
-        if os.path.exists(maf_file):
-            df = pd.read_csv(maf_file, sep='\t', comment='#', low_memory=False)
-            required_cols = ['Hugo_Symbol', 'Variant_Classification', 'Tumor_Sample_Barcode']
-            all_mutations.append(df[required_cols])
-            if len(df) == 0:
-                print(f"{maf_file} is empty!")
+        for suffix in maf_suffixes:
+            maf_file = os.path.join(directory, f"{case_id}{suffix}")
+            if os.path.exists(maf_file):
+                case_files[case_id] = maf_file
+                break
         else:
-            print(f"{maf_file} not found!")
-    
-    if not all_mutations:
+            missing.append(case_id)
+    return case_files, missing
+
+def read_maf_files(directory, case_ids, cohort=None, workers=n_workers):
+    """Read MAF files for specific cases.
+
+    If the cohort has been ingested into the columnar mutation store (see
+    mutation_store.py) and the partition is up to date with the MAFs in
+    directory, only the required columns and cases are loaded from there.
+    Otherwise the MAFs are parsed in parallel with a process pool, keeping
+    only the required columns. Missing and empty cases are collected in a
+    summary that is printed and kept in the result's attrs["maf_summary"].
+    """
+    required_cols = ['Hugo_Symbol', 'Variant_Classification', 'Tumor_Sample_Barcode']
+    summary = {"requested": len(case_ids), "loaded": 0, "missing": [], "empty": []}
+
+    if cohort is not None and has_cohort(cohort) and not is_stale(directory, cohort):
+        df = load_mutations(cohort, case_ids, columns=required_cols + ['case_id'])
+        ingested = set(partition_cases(cohort))
+        found = set(df['case_id'])
+        summary["missing"] = [case_id for case_id in case_ids if case_id not in ingested]
+        summary["empty"] = [case_id for case_id in case_ids if case_id in ingested and case_id not in found]
+    else:
+        case_files, summary["missing"] = find_maf_files(directory, case_ids)
+        if not case_files:
+            report_maf_summary(summary)
+            raise ValueError("No matching MAF files found for the filtered cases")
+        df, summary["empty"] = read_mafs(case_files, required_cols, workers)
+
+    summary["loaded"] = df['case_id'].nunique()
+    report_maf_summary(summary)
+    if len(df) == 0:
         raise ValueError("No matching MAF files found for the filtered cases")
-        
-    return pd.concat(all_mutations, ignore_index=True)
+
+    # Drop categories of cases that were filtered out so they do not show up as empty samples
+    mutations = df[required_cols].apply(lambda col: col.cat.remove_unused_categories())
+    mutations.attrs["maf_summary"] = summary
+    return mutations
 
 def create_mutation_matrix(mutations_df, top_n_genes=50):
-    """Create a mutation matrix for visualization."""
+    """Create a mutation matrix for visualization.
+
+    Returns the gene x sample mutation counts of the top genes, a matching
+    matrix of mutation codes (index into priority_order of the most severe
+    mutation, -1 where the gene is not mutated) and the gene frequencies.
+    """
     # Filter out mutations not in our categories
     mutations_df = mutations_df[mutations_df['Variant_Classification'].isin(mutation_categories.keys())]
     
+    # Build the full gene x sample matrix sparsely, only the top genes are made dense
+    matrix = SparseMutationMatrix.from_mutations(mutations_df, priority_order)
+    return top_mutation_matrix(matrix, top_n_genes)
+
+def top_mutation_matrix(matrix, top_n_genes=50):
+    """Slice the top genes out of a SparseMutationMatrix as dense counts, codes and frequencies."""
     # Get total number of cases
-    total_cases = len(mutations_df['Tumor_Sample_Barcode'].unique())
+    total_cases = matrix.shape[1]
     
     # Calculate mutation frequency per gene
-    gene_freq = mutations_df.groupby('Hugo_Symbol')['Tumor_Sample_Barcode'].nunique()
-    gene_freq_pct = (gene_freq / total_cases * 100).round(1)
+    gene_freq_pct = (matrix.gene_freq() / total_cases * 100).round(1)
     top_genes = gene_freq_pct.nlargest(top_n_genes).index
     
-    # Create gene x sample matrix
-    mutation_matrix = pd.crosstab(
-        mutations_df['Hugo_Symbol'],
-        mutations_df['Tumor_Sample_Barcode']
-    ).loc[top_genes]
-    
-    # Store mutation types
-    mutation_types = defaultdict(dict)
-    priority_order = ['Nonsense_Mutation', 'Frame_Shift_Del', 'Frame_Shift_Ins', 
-                     'Splice_Site', 'Translation_Start_Site', 'Nonstop_Mutation',
-                     'In_Frame_Del', 'In_Frame_Ins', 'Missense_Mutation', 'Silent']
-    
-    for gene in top_genes:
-        gene_mutations = mutations_df[mutations_df['Hugo_Symbol'] == gene]
-        for sample in gene_mutations['Tumor_Sample_Barcode'].unique():
-            sample_mutations = gene_mutations[gene_mutations['Tumor_Sample_Barcode'] == sample]
-            for mut_type in priority_order:
-                if mut_type in sample_mutations['Variant_Classification'].values:
-                    mutation_types[(gene, sample)] = mut_type
-                    break
-    
-    return mutation_matrix, mutation_types, gene_freq_pct
-
-def sort_samples(mutation_matrix):
-    """Sort samples based on their mutation patterns."""
-    binary_matrix = (mutation_matrix > 0).astype(int)
-    weights = np.zeros(binary_matrix.shape[1])
-    for i, gene_row in enumerate(binary_matrix.values):
-        weights += gene_row * 2**(binary_matrix.shape[0] - i - 1)
-    return np.argsort(-weights)
-
-def create_mutation_landscape(mutations_df, output_file, top_n_genes=30):
-    """Generate mutation landscape plot."""
-    mutation_matrix, mutation_types, gene_freq_pct = create_mutation_matrix(mutations_df, top_n_genes)
-    sorted_cols = sort_samples(mutation_matrix)
-    ordered_matrix = mutation_matrix.iloc[:, sorted_cols]
-    
-    plt.figure(figsize=plot_size)
-    ax = plt.gca()
-    
-    # Plot mutations
+    mutation_matrix, mutation_codes = matrix.select(genes=top_genes).to_frames()
+    return mutation_matrix, mutation_codes, gene_freq_pct
+
+def sort_samples(mutation_matrix, mutation_codes=None, burden=None):
+    """Sort samples based on their mutation patterns.
+
+    Samples are ordered lexicographically by the mutated/unmutated pattern of
+    the genes from top to bottom, mutated first. Ties can optionally be broken
+    by mutation_codes (more severe first, gene by gene) and then by burden
+    (one number per sample, higher first). Accepts a DataFrame or a
+    SparseMutationMatrix already sliced to the genes shown.
+    """
+    if isinstance(mutation_matrix, SparseMutationMatrix):
+        mutation_matrix = mutation_matrix.counts.toarray()
+    binary_matrix = np.asarray(mutation_matrix) > 0
+
+    # np.lexsort sorts by the last key first, so the least significant keys go in front
+    keys = []
+    if burden is not None:
+        keys.append(-np.asarray(burden))
+    if mutation_codes is not None:
+        keys.extend(np.asarray(mutation_codes)[::-1])
+    keys.extend(~binary_matrix[::-1])
+    if not keys:
+        return np.arange(binary_matrix.shape[1])
+    return np.lexsort(keys)
+
+def draw_mutation_image(ax, ordered_codes):
+    """Draw the code matrix as a single image, one discrete color per priority_order entry"""
+    cmap = ListedColormap([mutation_categories[mut_type][1] for mut_type in priority_order])
+    # Unmutated cells are masked so the axes background shows through, as with patches
+    codes = np.ma.masked_less(ordered_codes.values[::-1], 0)
+    n_genes, n_samples = codes.shape
+    ax.imshow(codes, cmap=cmap, vmin=-0.5, vmax=len(priority_order) - 0.5, origin='lower',
+              extent=(-0.5, n_samples - 0.5, -0.5, n_genes - 0.5), aspect='auto', interpolation='nearest')
+
+def draw_mutation_patches(ax, ordered_matrix, ordered_codes):
+    """Draw one Rectangle patch per mutated cell"""
     for i, gene in enumerate(ordered_matrix.index[::-1]):
         for j, sample in enumerate(ordered_matrix.columns):
-            if ordered_matrix.loc[gene, sample] > 0:
-                mut_type = mutation_types.get((gene, sample))
+            code = ordered_codes.loc[gene, sample]
+            if ordered_matrix.loc[gene, sample] > 0 and code >= 0:
+                mut_type = priority_order[code]
                 if mut_type in mutation_categories:
                     category, color = mutation_categories[mut_type]
                     ax.add_patch(plt.Rectangle(
                         (j - 0.5, i - 0.5), 1, 1,
                         facecolor=color, edgecolor='none'
                     ))
+
+def create_mutation_landscape(mutations_df, output_file, top_n_genes=30, title=tcga_cancer):
+    """Generate mutation landscape plot.
+
+    mutations_df is either a MAF table or a prebuilt SparseMutationMatrix.
+    """
+    with report.stage("matrix"):
+        if isinstance(mutations_df, SparseMutationMatrix):
+            mutation_matrix, mutation_codes, gene_freq_pct = top_mutation_matrix(mutations_df, top_n_genes)
+        else:
+            mutation_matrix, mutation_codes, gene_freq_pct = create_mutation_matrix(mutations_df, top_n_genes)
+        sorted_cols = sort_samples(mutation_matrix)
+        ordered_matrix = mutation_matrix.iloc[:, sorted_cols]
+        ordered_codes = mutation_codes.iloc[:, sorted_cols]
+        report.count("genes", mutation_matrix.shape[0])
+        report.count("samples", mutation_matrix.shape[1])
+
+    if write_cooccurrence:
+        with report.stage("cooccurrence"):
+            table_file = os.path.splitext(output_file)[0] + '_cooccurrence.tsv'
+            cooccurrence_table(mutation_matrix).to_csv(table_file, sep='\t', index=False)
     
-    # Add horizontal lines between genes
-    for i in range(len(ordered_matrix.index) - 1):
-        ax.axhline(y=i+0.5, color='white', linewidth=1, alpha=0.5, zorder=1)
-    
-    # Customize plot
-    ax.set_xlim(-0.5, len(ordered_matrix.columns) - 0.5)
-    ax.set_ylim(-0.5, len(ordered_matrix.index) - 0.5)
-    
-    # Add gene labels with frequency
-    yticks_pos = range(len(ordered_matrix.index))
-    gene_labels = [f"{gene} ({gene_freq_pct[gene]}%)" for gene in ordered_matrix.index[::-1]]
-    ax.set_yticks(yticks_pos)
-    ax.set_yticklabels(gene_labels, fontsize=gene_fontsize)
-    
-    # Format axes
-    ax.yaxis.set_ticks_position('none')
-    ax.spines['left'].set_visible(False)
-    ax.set_xticks([])
-    ax.set_xlabel(f'Samples (n={len(ordered_matrix.columns)})', fontsize=plot_fontsize)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.grid(False)
-    
-    # Add legend
-    legend_categories = [
-        ('Missense', '#336699'),
-        ('Inframe', '#009999'),
-        ('Critical Site', '#cc9933'),
-        ('Frameshift', '#ff6600'),
-        ('Nonsense', '#cc0033'),
-        ('Synonymous', '#d2dae2'),
-    ]
-    legend_elements = [plt.Rectangle((0, 0), 1, 1, facecolor=color, label=label)
-                      for label, color in legend_categories]
-    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1),
-             loc='upper left', fontsize=plot_fontsize)
-    
-    plt.title(tcga_cancer, fontsize=plot_fontsize+2)
-    plt.tight_layout()
-    plt.savefig(output_file, format=plot_format, dpi=plot_dpi, bbox_inches='tight')
-    plt.close()
+    with report.stage("plot"):
+        plt.figure(figsize=plot_size)
+        ax = plt.gca()
+    
+        # Plot mutations
+        if plot_raster:
+            draw_mutation_image(ax, ordered_codes)
+        else:
+            draw_mutation_patches(ax, ordered_matrix, ordered_codes)
+    
+        # Add horizontal lines between genes
+        for i in range(len(ordered_matrix.index) - 1):
+            ax.axhline(y=i+0.5, color='white', linewidth=1, alpha=0.5, zorder=1)
+    
+        # Customize plot
+        ax.set_xlim(-0.5, len(ordered_matrix.columns) - 0.5)
+        ax.set_ylim(-0.5, len(ordered_matrix.index) - 0.5)
+    
+        # Add gene labels with frequency
+        yticks_pos = range(len(ordered_matrix.index))
+        gene_labels = [f"{gene} ({gene_freq_pct[gene]}%)" for gene in ordered_matrix.index[::-1]]
+        ax.set_yticks(yticks_pos)
+        ax.set_yticklabels(gene_labels, fontsize=gene_fontsize)
+    
+        # Format axes
+        ax.yaxis.set_ticks_position('none')
+        ax.spines['left'].set_visible(False)
+        ax.set_xticks([])
+        ax.set_xlabel(f'Samples (n={len(ordered_matrix.columns)})', fontsize=plot_fontsize)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.grid(False)
+    
+        # Add legend
+        legend_categories = [
+            ('Missense', '#336699'),
+            ('Inframe', '#009999'),
+            ('Critical Site', '#cc9933'),
+            ('Frameshift', '#ff6600'),
+            ('Nonsense', '#cc0033'),
+            ('Synonymous', '#d2dae2'),
+        ]
+        legend_elements = [plt.Rectangle((0, 0), 1, 1, facecolor=color, label=label)
+                          for label, color in legend_categories]
+        ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1),
+                 loc='upper left', fontsize=plot_fontsize)
+    
+        plt.title(title, fontsize=plot_fontsize+2)
+        plt.tight_layout()
+        plt.savefig(output_file, format=plot_format, dpi=plot_dpi, bbox_inches='tight')
+        plt.close()
 
 def main():
-    # Read and filter clinical data
-    print("Reading clinical data...")
-    case_ids = read_clinical_data(tcga_clinical, tcga_include)
-    print(f"Found {len(case_ids)} cases matching histology criteria")
-    
-    # Read filtered MAF files
-    print("Reading MAF files for filtered cases...")
-    mutations_df = read_maf_files(tcga_snv_dir, case_ids)
-    
-    # Create the plot
-    print("Generating mutation landscape plot...")
-    output_file = tcga_cancer.replace(' ', '_') + '.' + plot_format
-    create_mutation_landscape(mutations_df, output_file, top_n_genes=30)
-    print(f"Plot saved as: {output_file}")
+    report.reset("mutation_landscape")
+    with profile(profile_file):
+        # Read and filter clinical data
+        print("Reading clinical data...")
+        with report.stage("clinical"):
+            case_ids = read_clinical_data(tcga_clinical, tcga_include)
+        print(f"Found {len(case_ids)} cases matching histology criteria")
+        
+        output_file = tcga_cancer.replace(' ', '_') + '.' + plot_format
+
+        # Read filtered MAF files
+        print("Reading MAF files for filtered cases...")
+        with report.stage("maf parsing"):
+            if use_cache:
+                mutations_df = cohort_matrix(tcga_snv_dir, tcga_cohort, priority_order, case_ids)
+            elif stream_mafs:
+                case_files, missing = find_maf_files(tcga_snv_dir, case_ids)
+                report_maf_summary({"requested": len(case_ids), "loaded": len(case_files), "missing": missing,
+                                    "empty": []})
+                aggregator = aggregate_mafs(case_files, priority_order)
+                write_burden(aggregator, os.path.splitext(output_file)[0] + '_burden.tsv')
+                mutations_df = aggregator.matrix()
+            else:
+                mutations_df = read_maf_files(tcga_snv_dir, case_ids, tcga_cohort)
+            if tcga_sample_types:
+                samples, _ = load_sample_metadata()
+                aliquots = select_aliquots(samples, sample_type=tcga_sample_types)
+                if isinstance(mutations_df, SparseMutationMatrix):
+                    mutations_df = mutations_df.select(samples=[s for s in mutations_df.samples if s in aliquots])
+                else:
+                    mutations_df = filter_mutations(mutations_df, aliquots)
+        
+        # Create the plot
+        print("Generating mutation landscape plot...")
+        create_mutation_landscape(mutations_df, output_file, top_n_genes=30)
+        print(f"Plot saved as: {output_file}")
+    report.summary()
+    if report_file:
+        report.write(report_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+class SparseMutationMatrix:
+    """Gene x sample mutation matrix kept as CSR matrices over integer-coded labels.
+
+    counts holds the number of mutations per (gene, sample) and codes the index
+    into priority_order of the most severe one, shifted by one so that 0 means
+    "not mutated" and both matrices stay sparse. Only mutated cells are stored,
+    so pan-cancer sets (~20k genes x ~10k samples) fit in little memory.
+    """
+    def __init__(self, genes, samples, counts, codes):
+        self.genes = pd.Index(np.asarray(genes))
+        self.samples = pd.Index(np.asarray(samples))
+        self.counts = sparse.csr_matrix(counts)
+        self.codes = sparse.csr_matrix(codes)
+        self.attrs = {}  # like DataFrame.attrs, e.g. the "maf_summary" of the cases it was built from
+
+    @classmethod
+    def from_mutations(cls, mutations_df, priority_order):
+        """Build the matrix from a MAF table, ignoring types not in priority_order"""
+        priority_rank = {mut_type: rank for rank, mut_type in enumerate(priority_order)}
+        ranks = mutations_df['Variant_Classification'].map(priority_rank).astype(float)
+        mutations_df = mutations_df[ranks.notna()]
+        ranks = ranks[ranks.notna()].to_numpy(dtype=np.int64)
+
+        gene_idx, genes = pd.factorize(mutations_df['Hugo_Symbol'], sort=True)
+        sample_idx, samples = pd.factorize(mutations_df['Tumor_Sample_Barcode'], sort=True)
+        shape = (len(genes), len(samples))
+
+        # Duplicate coordinates are summed, giving the mutation count per cell
+        counts = sparse.coo_matrix((np.ones(len(ranks), dtype=np.int32), (gene_idx, sample_idx)), shape=shape)
+
+        # Most severe mutation per cell: sort by (cell, rank) and keep the first of each cell
+        cells = gene_idx.astype(np.int64) * shape[1] + sample_idx
+        order = np.lexsort((ranks, cells))
+        cells, ranks = cells[order], ranks[order]
+        first = np.ones(len(cells), dtype=bool)
+        first[1:] = cells[1:] != cells[:-1]
+        codes = sparse.coo_matrix(
+            ((ranks[first] + 1).astype(np.int8), (cells[first] // shape[1], cells[first] % shape[1])), shape=shape
+        )
+        return cls(genes, samples, counts.tocsr(), codes.tocsr())
+
+    @classmethod
+    def from_cells(cls, cells):
+        """Build the matrix from per-(gene, sample) aggregates.
+
+        cells has Hugo_Symbol, Tumor_Sample_Barcode, count (mutations in the cell)
+        and code (index into priority_order of the most severe one) columns.
+        """
+        cells = cells.groupby(['Hugo_Symbol', 'Tumor_Sample_Barcode'], observed=True, as_index=False).agg(
+            count=('count', 'sum'), code=('code', 'min'))
+        gene_idx, genes = pd.factorize(cells['Hugo_Symbol'], sort=True)
+        sample_idx, samples = pd.factorize(cells['Tumor_Sample_Barcode'], sort=True)
+        shape = (len(genes), len(samples))
+        counts = sparse.coo_matrix((cells['count'].to_numpy(dtype=np.int32), (gene_idx, sample_idx)), shape=shape)
+        codes = sparse.coo_matrix(((cells['code'].to_numpy() + 1).astype(np.int8), (gene_idx, sample_idx)),
+                                  shape=shape)
+        return cls(genes, samples, counts.tocsr(), codes.tocsr())
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def gene_freq(self):
+        """Number of mutated samples per gene"""
+        return pd.Series(np.diff(self.codes.indptr), index=self.genes)
+
+    def top_genes(self, n):
+        """Genes mutated in the most samples, most frequent first"""
+        return self.gene_freq().nlargest(n).index
+
+    def select(self, genes=None, samples=None):
+        """Slice rows and/or columns by label, keeping the given order"""
+        rows = np.arange(len(self.genes)) if genes is None else self.genes.get_indexer(genes)
+        cols = np.arange(len(self.samples)) if samples is None else self.samples.get_indexer(samples)
+        if (rows < 0).any() or (cols < 0).any():
+            raise KeyError("Unknown gene or sample label")
+        return SparseMutationMatrix(self.genes[rows], self.samples[cols],
+                                    self.counts[rows][:, cols], self.codes[rows][:, cols])
+
+    def to_frames(self):
+        """Dense counts and codes (-1 = not mutated) DataFrames, for small slices only"""
+        counts = pd.DataFrame(self.counts.toarray(), index=self.genes, columns=self.samples)
+        codes = pd.DataFrame(self.codes.toarray().astype(int) - 1, index=self.genes, columns=self.samples)
+        return counts, codes
@@ -0,0 +1,171 @@
+import os
+import glob
+import json
+import io
+import gzip
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from instrumentation import report
+
+try:
+    import pyarrow  # noqa: F401  (multi-threaded CSV parser)
+    csv_engine = "pyarrow"
+except ImportError:
+    csv_engine = "c"
+
+try:
+    import zstandard
+except ImportError:  # only needed to read .maf.zst files
+    zstandard = None
+
+# Store settings
+store_dir = "data_mutation_store"  # partitioned Parquet store, one cohort=<COHORT> directory per cohort
+store_file = "mutations.parquet"
+cases_file = "_cases.json"  # case IDs a partition was built from, empty MAFs included
+snv_prefix = "data_snv_"  # per-case MAF directories are named data_snv_<COHORT>
+maf_cols = ['Hugo_Symbol', 'Variant_Classification', 'Tumor_Sample_Barcode']
+n_workers = os.cpu_count() or 1  # processes used to parse MAFs
+
+def partition_file(cohort, directory=store_dir):
+    """Path of the Parquet file holding one cohort"""
+    return os.path.join(directory, f"cohort={cohort}", store_file)
+
+maf_suffixes = (".maf", ".maf.gz", ".maf.zst")  # MAFs may be stored plain, gzipped as delivered or as zstd
+
+def maf_case_files(snv_dir):
+    """Map case IDs to their MAF in a download directory, whatever its compression"""
+    case_files = {}
+    for maf_file in sorted(path for suffix in maf_suffixes for path in glob.glob(os.path.join(snv_dir, "*" + suffix))):
+        case_id = os.path.basename(maf_file).split(".maf")[0]
+        case_files.setdefault(case_id, maf_file)
+    return case_files
+
+def open_maf_bytes(maf_file):
+    """Open a plain, gzip or zstd MAF as a buffered binary stream"""
+    if maf_file.endswith(".gz"):
+        return gzip.open(maf_file, "rb")
+    if maf_file.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Reading .maf.zst files requires the zstandard package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(maf_file, "rb"), closefd=True))
+    return open(maf_file, "rb")
+
+def open_maf(maf_file):
+    """Open a plain, gzip or zstd MAF as text"""
+    return io.TextIOWrapper(open_maf_bytes(maf_file))
+
+def count_header_lines(maf_file):
+    """Number of leading "#" comment lines (e.g. "#version 2.4") in a MAF"""
+    n = 0
+    with open_maf(maf_file) as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            n += 1
+    return n
+
+def read_maf(maf_file, columns=maf_cols, engine=csv_engine):
+    """Parse only the given columns of one MAF, as strings"""
+    # The "#" lines are consumed on the open file rather than with skiprows: the pyarrow engine
+    # ignores skiprows when it infers the header and would take "#version 2.4" for the column names.
+    with open_maf_bytes(maf_file) as f:
+        while f.peek(1)[:1] == b"#":
+            f.readline()
+        return pd.read_csv(f, sep='\t', usecols=columns, dtype=str, engine=engine)
+
+def read_mafs(case_files, columns=maf_cols, workers=n_workers, engine=csv_engine):
+    """Parse many MAFs in a process pool and concatenate them once.
+
+    case_files maps case IDs to MAF paths. Returns the mutations with an added
+    case_id column, all as categoricals, and the case IDs whose MAF had no rows.
+    """
+    if not case_files:
+        raise ValueError("No MAF files to read")
+    case_ids = list(case_files)
+    maf_files = list(case_files.values())
+    if workers > 1 and len(maf_files) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(len(maf_files) // (4 * workers), 1)
+            dfs = list(executor.map(read_maf, maf_files, repeat(columns), repeat(engine), chunksize=chunksize))
+    else:
+        dfs = [read_maf(maf_file, columns, engine) for maf_file in maf_files]
+
+    empty = [case_id for case_id, df in zip(case_ids, dfs) if len(df) == 0]
+    mutations = pd.concat([df.assign(case_id=case_id) for case_id, df in zip(case_ids, dfs)], ignore_index=True)
+    for col in mutations.columns:
+        mutations[col] = mutations[col].astype('category')
+    report.count("files_parsed", len(maf_files))
+    report.count("rows", len(mutations))
+    return mutations, empty
+
+def report_maf_summary(summary):
+    """Print how many of the requested cases were loaded, missing or empty"""
+    print(f"Loaded {summary['loaded']}/{summary['requested']} cases "
+          f"({len(summary['missing'])} missing, {len(summary['empty'])} empty)")
+    for case_id in summary['missing']:
+        print(f"  missing: {case_id}")
+    for case_id in summary['empty']:
+        print(f"  empty: {case_id}")
+
+def partition_cases(cohort, directory=store_dir):
+    """Case IDs a cohort partition was built from, None if unknown"""
+    path = os.path.join(os.path.dirname(partition_file(cohort, directory)), cases_file)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def is_stale(snv_dir, cohort, directory=store_dir):
+    """Whether a cohort partition is missing, older than any of its MAFs or built from other cases"""
+    output_file = partition_file(cohort, directory)
+    if not os.path.exists(output_file):
+        return True
+    built = os.path.getmtime(output_file)
+    case_files = maf_case_files(snv_dir)
+    if any(os.path.getmtime(maf_file) > built for maf_file in case_files.values()):
+        return True
+    return partition_cases(cohort, directory) != sorted(case_files)
+
+def build_cohort(snv_dir, cohort, directory=store_dir):
+    """Convert the per-case MAFs of one cohort into a single Parquet partition.
+
+    Only maf_cols are kept, plus the case ID taken from the file name, all
+    stored as categoricals. Returns the number of mutations written.
+    """
+    case_files = maf_case_files(snv_dir)
+    if not case_files:
+        raise ValueError(f"No MAF files found in {snv_dir}")
+    mutations, _ = read_mafs(case_files)
+
+    output_file = partition_file(cohort, directory)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    temp_file = output_file + ".part"
+    mutations.to_parquet(temp_file, index=False)
+    os.replace(temp_file, output_file)
+    # Written last: a partition without its case list counts as stale
+    with open(os.path.join(os.path.dirname(output_file), cases_file), "w") as f:
+        json.dump(sorted(case_files), f)
+    return len(mutations)
+
+def build_store(snv_dirs=None, directory=store_dir, force=False):
+    """Build or refresh the partitions of every data_snv_<COHORT> directory"""
+    if snv_dirs is None:
+        snv_dirs = sorted(d for d in glob.glob(snv_prefix + "*") if os.path.isdir(d))
+    for snv_dir in snv_dirs:
+        cohort = os.path.basename(os.path.normpath(snv_dir))[len(snv_prefix):]
+        if not force and not is_stale(snv_dir, cohort, directory):
+            print(f"{cohort}: up to date")
+            continue
+        print(f"{cohort}: {build_cohort(snv_dir, cohort, directory)} mutations stored")
+
+def has_cohort(cohort, directory=store_dir):
+    return os.path.exists(partition_file(cohort, directory))
+
+def load_mutations(cohort, case_ids=None, columns=maf_cols, directory=store_dir):
+    """Load only the requested columns and cases of one cohort from the store"""
+    filters = [('case_id', 'in', list(case_ids))] if case_ids is not None else None
+    return pd.read_parquet(partition_file(cohort, directory), columns=list(columns), filters=filters)
+
+if __name__ == "__main__":
+    build_store()
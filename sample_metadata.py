@@ -0,0 +1,100 @@
+import os
+import pandas as pd
+from gdc_api import query_cases, query_files
+
+# Sample metadata settings
+metadata_file = "sample_metadata.parquet"  # one row per aliquot of every TCGA case
+program_filter = {"op": "=", "content": {"field": "project.program.name", "value": "TCGA"}}
+case_fields = [
+    "submitter_id",
+    "project.project_id",
+    "samples.submitter_id",
+    "samples.sample_id",
+    "samples.sample_type",
+    "samples.tissue_type",
+    "samples.tumor_descriptor",
+    "samples.portions.analytes.aliquots.aliquot_id",
+    "samples.portions.analytes.aliquots.submitter_id",
+]
+maf_filter = {
+    "op": "and",
+    "content": [
+        {"op": "=", "content": {"field": "cases.project.program.name", "value": "TCGA"}},
+        {"op": "=", "content": {"field": "data_type", "value": "Masked Somatic Mutation"}},
+    ]
+}
+maf_fields = ["file_id", "analysis.workflow_type"]
+
+def flatten_cases(case_hits):
+    """One row per aliquot from the nested case -> samples -> portions -> analytes -> aliquots hits"""
+    rows = []
+    for case in case_hits:
+        cohort = case.get("project", {}).get("project_id", "").replace("TCGA-", "")
+        for sample in case.get("samples", []):
+            sample_row = {
+                "case_id": case.get("submitter_id"),
+                "cohort": cohort,
+                "sample_barcode": sample.get("submitter_id"),
+                "sample_uuid": sample.get("sample_id"),
+                "sample_type": sample.get("sample_type"),
+                "tissue_type": sample.get("tissue_type"),
+                "tumor_descriptor": sample.get("tumor_descriptor"),
+            }
+            aliquots = [aliquot for portion in sample.get("portions", [])
+                        for analyte in portion.get("analytes", [])
+                        for aliquot in analyte.get("aliquots", [])]
+            for aliquot in aliquots or [{}]:
+                rows.append({**sample_row,
+                             "aliquot_barcode": aliquot.get("submitter_id"),
+                             "aliquot_uuid": aliquot.get("aliquot_id")})
+    return pd.DataFrame(rows)
+
+def harvest_sample_metadata(output_file=metadata_file, **kwargs):
+    """Pull sample and aliquot metadata of every TCGA case in one paged, field-projected query.
+
+    The workflow_type of every TCGA MAF comes from a second paged query and is
+    kept per file_id. Both query results are cached by gdc_api, kwargs (e.g.
+    ttl) are passed on to it. The tables are saved together as Parquet.
+    """
+    samples = flatten_cases(query_cases(program_filter, ",".join(case_fields), **kwargs))
+    workflows = pd.DataFrame(
+        [(hit["file_id"], hit.get("analysis", {}).get("workflow_type")) for hit in
+         query_files(maf_filter, ",".join(maf_fields), **kwargs)],
+        columns=["file_id", "workflow_type"]
+    )
+    for col in ["cohort", "sample_type", "tissue_type", "tumor_descriptor"]:
+        samples[col] = samples[col].astype("category")
+    samples.to_parquet(output_file, index=False)
+    workflows.to_parquet(os.path.splitext(output_file)[0] + "_workflows.parquet", index=False)
+    print(f"Harvested {samples['sample_barcode'].nunique()} samples / {len(samples)} aliquots "
+          f"of {samples['case_id'].nunique()} cases")
+    return samples, workflows
+
+def load_sample_metadata(output_file=metadata_file):
+    """Local sample and workflow tables, harvested from the GDC on first use"""
+    workflows_file = os.path.splitext(output_file)[0] + "_workflows.parquet"
+    if not (os.path.exists(output_file) and os.path.exists(workflows_file)):
+        return harvest_sample_metadata(output_file)
+    return pd.read_parquet(output_file), pd.read_parquet(workflows_file)
+
+def join_case_index(index, output_file=metadata_file):
+    """Attach sample/aliquot rows to the case index (see case_index.py), plus the workflow of each MAF"""
+    samples, workflows = load_sample_metadata(output_file)
+    index = index.merge(workflows, on="file_id", how="left")
+    samples = samples.astype({"cohort": str})
+    index = index.assign(cohort=index["cohort"].astype(str))
+    return index.merge(samples, on=["cohort", "case_id"], how="left")
+
+def select_aliquots(samples, **filters):
+    """Aliquot barcodes matching every filter, e.g. select_aliquots(samples, sample_type=["Primary Tumor"])"""
+    mask = pd.Series(True, index=samples.index)
+    for field, values in filters.items():
+        mask &= samples[field].isin([values] if isinstance(values, str) else values)
+    return set(samples.loc[mask, "aliquot_barcode"].dropna())
+
+def filter_mutations(mutations_df, aliquots):
+    """Keep the MAF rows whose Tumor_Sample_Barcode is one of the selected aliquots"""
+    return mutations_df[mutations_df["Tumor_Sample_Barcode"].isin(aliquots)]
+
+if __name__ == "__main__":
+    harvest_sample_metadata(ttl=0)
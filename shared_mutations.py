@@ -0,0 +1,142 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from mutation_store import (has_cohort, is_stale, load_mutations, maf_case_files, read_mafs, snv_prefix, maf_cols,
+                            n_workers)
+from landscape_cache import case_signature
+
+# Shared mutation dataset settings
+dataset_dir = "data_shared_mutations"  # point at /dev/shm to keep the arrays in RAM only
+dataset_cols = maf_cols + ['case_id']
+meta_file = "dataset.json"
+
+def cohort_signature(cohort):
+    """Path, size and mtime of every MAF of a cohort, keyed by case ID"""
+    return {case_id: case_signature(maf_file) for case_id, maf_file in maf_case_files(snv_prefix + cohort).items()}
+
+def read_cohort(cohort, workers=n_workers):
+    """Mutations of one cohort as categoricals, from the mutation store if up to date, else from its MAFs"""
+    if has_cohort(cohort) and not is_stale(snv_prefix + cohort, cohort):
+        return load_mutations(cohort, columns=dataset_cols)
+    case_files = maf_case_files(snv_prefix + cohort)
+    if not case_files:
+        return None
+    mutations, _ = read_mafs(case_files, maf_cols, workers)
+    return mutations[dataset_cols]
+
+def stale_cohorts(cohorts, directory=dataset_dir):
+    """Cohorts whose MAFs were added, removed or changed since the dataset was built"""
+    if not has_dataset(directory):
+        return list(cohorts)
+    with open(os.path.join(directory, meta_file)) as f:
+        signatures = json.load(f).get("signatures", {})
+    return [cohort for cohort in cohorts if signatures.get(cohort) != cohort_signature(cohort)]
+
+def build_dataset(cohorts, directory=dataset_dir, workers=n_workers):
+    """Write the integer-coded mutations of many cohorts as one memory-mappable dataset.
+
+    Every column is stored as a .npy array of category codes, in the smallest
+    integer type pandas uses for that many categories, with the categories of
+    all cohorts in dataset.json. Rows are grouped by cohort and the row range
+    and MAF signatures of each cohort are kept there too, so a cohort is a
+    contiguous slice. Cohorts whose MAFs are unchanged since the previous build
+    are copied from it instead of being read again.
+    """
+    stale = set(stale_cohorts(cohorts, directory))
+    previous = MutationDataset(directory) if has_dataset(directory) else None
+    os.makedirs(directory, exist_ok=True)
+    signatures = {}
+    local = []  # (cohort, {col: (codes, categories)}), compact until the global categories are known
+    for cohort in cohorts:
+        signatures[cohort] = cohort_signature(cohort)
+        if cohort not in stale:
+            if cohort in previous.cohorts:
+                start, stop = previous.cohorts[cohort]
+                local.append((cohort, {col: (np.array(codes[start:stop]), previous.dtypes[col].categories)
+                                       for col, codes in previous.codes.items()}))
+            continue
+        mutations = read_cohort(cohort, workers)
+        if mutations is None or len(mutations) == 0:
+            print(f"{cohort}: no mutations, skipped")
+            continue
+        columns = {}
+        for col in dataset_cols:
+            values = mutations[col].astype('category')
+            columns[col] = (values.cat.codes.to_numpy(), values.cat.categories)
+        local.append((cohort, columns))
+
+    categories = {col: pd.Index(sorted(set().union(*(columns[col][1] for _, columns in local))))
+                  for col in dataset_cols}
+    n_rows = sum(len(columns[dataset_cols[0]][0]) for _, columns in local)
+    ranges = {}
+    for col in dataset_cols:
+        dtype = pd.Categorical.from_codes([], categories=categories[col]).codes.dtype
+        temp_file = os.path.join(directory, f"{col}.npy.part")
+        codes = np.lib.format.open_memmap(temp_file, mode='w+', dtype=dtype, shape=(n_rows,))
+        start = 0
+        for cohort, columns in local:
+            cohort_codes, cohort_categories = columns[col]
+            # Translate the cohort's own codes to the shared categories (-1 stays missing)
+            recode = categories[col].get_indexer(cohort_categories).astype(dtype)
+            codes[start:start + len(cohort_codes)] = np.where(cohort_codes >= 0, recode[cohort_codes], -1)
+            ranges[cohort] = [start, start + len(cohort_codes)]
+            start += len(cohort_codes)
+        codes.flush()
+        del codes
+        os.replace(temp_file, os.path.join(directory, f"{col}.npy"))
+
+    # The metadata is written last, so an interrupted build is never attached to
+    with open(os.path.join(directory, meta_file), "w") as f:
+        json.dump({"rows": n_rows, "cohorts": ranges, "signatures": signatures,
+                   "categories": {col: list(categories[col]) for col in dataset_cols}}, f)
+    print(f"Wrote {n_rows} mutations of {len(ranges)} cohorts to {directory} ({len(stale)} cohorts read)")
+    return MutationDataset(directory)
+
+def update_dataset(cohorts, directory=dataset_dir, workers=n_workers):
+    """Attach to the dataset, first rebuilding it if any cohort's MAFs changed since it was built"""
+    stale = stale_cohorts(cohorts, directory)
+    if stale:
+        print(f"Mutation dataset out of date for {len(stale)} cohorts, rebuilding")
+        return build_dataset(cohorts, directory, workers)
+    return MutationDataset(directory)
+
+class MutationDataset:
+    """Read-only view of a dataset written by build_dataset.
+
+    The code arrays are memory-mapped, so every process attaching to the same
+    directory shares one copy through the page cache and attaching costs only
+    reading the categories. frame() wraps slices of the maps in categoricals
+    without copying them: frame[col].array.codes is the memory map itself
+    (frame[col].cat.codes builds a new Series, which copies).
+    """
+    def __init__(self, directory=dataset_dir):
+        self.directory = directory
+        with open(os.path.join(directory, meta_file)) as f:
+            meta = json.load(f)
+        self.rows = meta["rows"]
+        self.cohorts = meta["cohorts"]
+        self.dtypes = {col: pd.CategoricalDtype(categories) for col, categories in meta["categories"].items()}
+        self.codes = {col: np.load(os.path.join(directory, f"{col}.npy"), mmap_mode='r') for col in self.dtypes}
+
+    def frame(self, cohort=None, case_ids=None):
+        """Mutations of one cohort (or all) as a categorical DataFrame over the maps.
+
+        Selecting case_ids copies the selected rows; without it nothing is copied.
+        """
+        start, stop = self.cohorts[cohort] if cohort is not None else (0, self.rows)
+        mutations = pd.DataFrame(
+            {col: pd.Categorical.from_codes(codes[start:stop], dtype=self.dtypes[col])
+             for col, codes in self.codes.items()},
+            copy=False
+        )
+        if case_ids is not None:
+            mutations = mutations[mutations['case_id'].isin(case_ids)]
+        return mutations
+
+def has_dataset(directory=dataset_dir):
+    return os.path.exists(os.path.join(directory, meta_file))
+
+if __name__ == "__main__":
+    from cancer_types import cancer_types
+    update_dataset(list(cancer_types))
@@ -0,0 +1,47 @@
+import os
+import copy
+import tmp_combine_cohort
+from cancer_types import cohort_columns
+from tmp_combine_cohort import load_clinical_cohorts
+
+def write_clinical(directory, cohort, rows):
+    cols = list(cohort_columns(cohort).values())
+    lines = ["\t".join(cols)] + ["\t".join(["meta"] * len(cols))] * 2 + ["\t".join(row) for row in rows]
+    with open(os.path.join(directory, f"nationwidechildrens.org_clinical_patient_{cohort.lower()}.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def test_rebuild_on_mapping_change_and_retry_failed_files(tmp_path, monkeypatch):
+    clinical_dir = tmp_path / "clinical"
+    clinical_dir.mkdir()
+    write_clinical(clinical_dir, "PAAD", [["TCGA-AA-0001", "Pancreas-Adenocarcinoma Ductal Type", "Stage I", "Alive",
+                                           "[Not Applicable]", "MALE", "WHITE"]])
+    # A directory where a file is expected cannot be read
+    (clinical_dir / "nationwidechildrens.org_clinical_patient_acc.txt").mkdir()
+    output_file = str(tmp_path / "combined.parquet")
+
+    combined = load_clinical_cohorts(str(clinical_dir), output_file, workers=1)
+    assert combined.attrs["failed"] == ["ACC"]
+    assert list(combined['diagnosis']) == ["Pancreatic Ductal Adenocarcinoma"]
+
+    # The failed file is not recorded as current, so the table is rebuilt and it is tried again
+    calls = []
+    combine = tmp_combine_cohort.combine_clinical_cohorts
+    monkeypatch.setattr(tmp_combine_cohort, "combine_clinical_cohorts",
+                        lambda *args: calls.append(args) or combine(*args))
+    load_clinical_cohorts(str(clinical_dir), output_file, workers=1)
+    assert len(calls) == 1
+
+    (clinical_dir / "nationwidechildrens.org_clinical_patient_acc.txt").rmdir()
+    write_clinical(clinical_dir, "ACC", [["TCGA-OR-0001", "Adrenocortical carcinoma- Usual Type", "Stage II", "Alive",
+                                          "[Not Applicable]", "FEMALE", "WHITE"]])
+    load_clinical_cohorts(str(clinical_dir), output_file, workers=1)
+    load_clinical_cohorts(str(clinical_dir), output_file, workers=1)
+    assert len(calls) == 2
+
+    # Changing a diagnosis mapping rebuilds the table
+    cancer_types = copy.deepcopy(tmp_combine_cohort.cancer_types)
+    cancer_types['PAAD']['diagnoses']["Pancreas-Adenocarcinoma Ductal Type"] = "PDAC"
+    monkeypatch.setattr(tmp_combine_cohort, "cancer_types", cancer_types)
+    combined = load_clinical_cohorts(str(clinical_dir), output_file, workers=1)
+    assert len(calls) == 3
+    assert combined.loc[combined['cohort'] == 'PAAD', 'diagnosis'].tolist() == ["PDAC"]
@@ -0,0 +1,64 @@
+import time
+import types
+import pytest
+from requests.exceptions import HTTPError
+import gdc_api
+from gdc_api import RateLimiter, make_request_with_retry, create_session_with_retry
+from mock_gdc_server import MockGDCServer
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the waits of gdc_api instead of sleeping through them"""
+    waits = []
+    monkeypatch.setattr(gdc_api, "time", types.SimpleNamespace(monotonic=time.monotonic, sleep=waits.append))
+    return waits
+
+@pytest.fixture
+def server(request):
+    server = MockGDCServer(0, n_cases=20, **getattr(request, "param", {}))
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.mark.parametrize("server", [{"error_rate": 0.3, "reset_rate": 0.2, "seed": 3}], indirect=True)
+def test_retries_until_the_download_succeeds(server, sleeps):
+    session = create_session_with_retry()
+    for file_id, payload in server.payloads.items():
+        response = make_request_with_retry(f"{server.url}/data/{file_id}", session=session, max_retries=20)
+        assert response.content == payload
+    assert server.stats["errors"] and server.stats["resets"]
+    assert len(sleeps) == server.stats["errors"] + server.stats["resets"]
+
+def test_other_client_errors_fail_at_once_and_close_the_response(server, sleeps):
+    limiter = RateLimiter(None, concurrency=2)
+    with pytest.raises(HTTPError) as raised:
+        make_request_with_retry(f"{server.url}/data/missing", session=create_session_with_retry(),
+                                rate_limiter=limiter, stream=True)
+    assert raised.value.response.status_code == 404
+    assert raised.value.response.raw.closed
+    assert server.stats["requests"] == 1 and sleeps == []
+    assert limiter.in_flight == 0
+
+@pytest.mark.parametrize("server", [{"error_rate": 1.0, "retry_after": 7}], indirect=True)
+def test_retry_after_is_honoured_and_throttles_the_limiter(server, sleeps):
+    limiter = RateLimiter(8, concurrency=4)
+    with pytest.raises(HTTPError) as raised:
+        make_request_with_retry(f"{server.url}/data/missing", session=create_session_with_retry(),
+                                rate_limiter=limiter, max_retries=3)
+    assert raised.value.response.status_code == 503
+    assert server.stats["requests"] == 3
+    # Two waits between three attempts, each the server's Retry-After
+    assert [wait for wait in sleeps if wait == 7.0] == [7.0, 7.0]
+    assert limiter.rate == 1 and limiter.concurrency == 1 and limiter.in_flight == 0
+    assert limiter.next_time > time.monotonic() + 6
+
+def test_limiter_halves_on_throttle_and_ramps_back_on_success():
+    limiter = RateLimiter(10, concurrency=8)
+    limiter.throttle()
+    limiter.throttle()
+    assert limiter.rate == 2.5 and limiter.concurrency == 2
+    limiter.success()
+    assert limiter.rate == 3.5 and limiter.concurrency == 2.5
+    for _ in range(50):
+        limiter.success()
+    assert limiter.rate == 10 and limiter.concurrency == 8
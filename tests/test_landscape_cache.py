@@ -0,0 +1,51 @@
+import os
+import shutil
+import benchmark
+from mutation_store import maf_case_files, maf_cols, build_store
+from landscape_cache import cohort_matrix
+from mutation_landscape import priority_order
+
+def assert_same_matrix(matrix, expected):
+    assert list(matrix.genes) == list(expected.genes)
+    assert list(matrix.samples) == list(expected.samples)
+    assert (matrix.counts != expected.counts).nnz == 0
+    assert (matrix.codes != expected.codes).nnz == 0
+
+def test_incremental_update_matches_full_rebuild(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, snv_dir, _ = benchmark.generate_cohort("gen", 12, 60, 25)
+    _, extra_dir, _ = benchmark.generate_cohort("extra", 14, 60, 25, seed=1)
+    cohort_matrix(snv_dir, "SYN", priority_order, directory="cache", workers=1)
+
+    cases = sorted(maf_case_files(snv_dir))
+    # Add a case, change one (same case ID, other mutations), remove one and empty one
+    extra_files = maf_case_files(extra_dir)
+    added = sorted(extra_files)[-1]
+    shutil.copy(extra_files[added], os.path.join(snv_dir, f"{added}.maf"))
+    shutil.copy(extra_files[cases[1]], maf_case_files(snv_dir)[cases[1]])
+    os.remove(maf_case_files(snv_dir)[cases[2]])
+    with open(maf_case_files(snv_dir)[cases[3]], "w") as f:
+        f.write("#version 2.4\n" + "\t".join(maf_cols) + "\n")
+
+    requested = cases + [added]
+    incremental = cohort_matrix(snv_dir, "SYN", priority_order, requested, directory="cache", workers=1)
+    rebuilt = cohort_matrix(snv_dir, "SYN", priority_order, requested, directory="rebuilt", workers=1)
+    assert_same_matrix(incremental, rebuilt)
+    assert added in set(s[:12] for s in incremental.samples)
+    assert cases[2] not in set(s[:12] for s in incremental.samples)
+
+    summary = incremental.attrs["maf_summary"]
+    assert summary == rebuilt.attrs["maf_summary"]
+    assert summary["missing"] == [cases[2]]
+    assert summary["empty"] == [cases[3]]
+    assert summary["loaded"] == len(requested) - 2
+
+    # Nothing changed: served from the cache as is
+    again = cohort_matrix(snv_dir, "SYN", priority_order, requested, directory="cache", workers=1)
+    assert_same_matrix(again, rebuilt)
+
+    # A cold cache takes the changed cases from an up-to-date mutation store
+    build_store([snv_dir])
+    from_store = cohort_matrix(snv_dir, "SYN", priority_order, requested, directory="from_store", workers=1)
+    assert_same_matrix(from_store, rebuilt)
+    assert from_store.attrs["maf_summary"] == summary
@@ -0,0 +1,23 @@
+import pandas as pd
+import benchmark
+import maf_aggregate
+from maf_aggregate import aggregate_mafs
+from mutation_store import maf_case_files
+from mutation_landscape import read_maf_files, create_mutation_matrix, top_mutation_matrix, priority_order
+
+def test_streamed_matrix_matches_create_mutation_matrix(tmp_path, monkeypatch):
+    _, snv_dir, _ = benchmark.generate_cohort(str(tmp_path), 40, 200, 30)
+    case_files = maf_case_files(snv_dir)
+    # Small chunks and buffer so that rows are folded in over many compactions
+    monkeypatch.setattr(maf_aggregate, "compact_rows", 100)
+    aggregator = aggregate_mafs(case_files, priority_order, workers=1, chunksize=7)
+
+    mutations = read_maf_files(snv_dir, list(case_files), workers=1)
+    expected_matrix, expected_codes, expected_freq = create_mutation_matrix(mutations, 30)
+    mutation_matrix, mutation_codes, gene_freq_pct = top_mutation_matrix(aggregator.matrix(), 30)
+
+    pd.testing.assert_frame_equal(mutation_matrix, expected_matrix)
+    pd.testing.assert_frame_equal(mutation_codes, expected_codes)
+    pd.testing.assert_series_equal(gene_freq_pct, expected_freq)
+    assert aggregator.rows == len(mutations)
+    assert aggregator.burden['mutations'].sum() == len(mutations)
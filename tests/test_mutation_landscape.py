@@ -0,0 +1,83 @@
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import pytest
+from mutation_landscape import create_mutation_matrix, sort_samples, mutation_categories, priority_order
+
+def reference_mutation_matrix(mutations_df, top_n_genes=50):
+    """The nested loop create_mutation_matrix was before it went sparse"""
+    mutations_df = mutations_df[mutations_df['Variant_Classification'].isin(mutation_categories.keys())]
+    total_cases = len(mutations_df['Tumor_Sample_Barcode'].unique())
+    gene_freq = mutations_df.groupby('Hugo_Symbol')['Tumor_Sample_Barcode'].nunique()
+    gene_freq_pct = (gene_freq / total_cases * 100).round(1)
+    top_genes = gene_freq_pct.nlargest(top_n_genes).index
+    mutation_matrix = pd.crosstab(mutations_df['Hugo_Symbol'], mutations_df['Tumor_Sample_Barcode']).loc[top_genes]
+
+    mutation_types = defaultdict(dict)
+    for gene in top_genes:
+        gene_mutations = mutations_df[mutations_df['Hugo_Symbol'] == gene]
+        for sample in gene_mutations['Tumor_Sample_Barcode'].unique():
+            sample_mutations = gene_mutations[gene_mutations['Tumor_Sample_Barcode'] == sample]
+            for mut_type in priority_order:
+                if mut_type in sample_mutations['Variant_Classification'].values:
+                    mutation_types[(gene, sample)] = mut_type
+                    break
+    return mutation_matrix, mutation_types, gene_freq_pct
+
+def reference_sort_samples(mutation_matrix):
+    """The weight sum sort_samples was before it went lexicographic, stable on ties"""
+    binary_matrix = (mutation_matrix > 0).astype(int)
+    weights = np.zeros(binary_matrix.shape[1])
+    for i, gene_row in enumerate(binary_matrix.values):
+        weights += gene_row * 2**(binary_matrix.shape[0] - i - 1)
+    return np.argsort(-weights, kind='stable')
+
+def synthetic_mutations(seed, n_rows=3000, n_genes=120, n_samples=60):
+    rng = np.random.default_rng(seed)
+    classes = priority_order + ['Intron', "3'UTR", 'RNA']
+    # Skewed gene choice so that top genes, ties and multi-hit cells all occur
+    gene_weights = 1 / np.arange(1, n_genes + 1)
+    return pd.DataFrame({
+        'Hugo_Symbol': rng.choice([f"GENE{i}" for i in range(n_genes)], n_rows, p=gene_weights / gene_weights.sum()),
+        'Variant_Classification': rng.choice(classes, n_rows),
+        'Tumor_Sample_Barcode': rng.choice([f"TCGA-AA-{i:04d}-01A" for i in range(n_samples)], n_rows),
+    })
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("top_n_genes", [10, 30])
+def test_create_mutation_matrix_matches_nested_loop(seed, top_n_genes):
+    mutations = synthetic_mutations(seed)
+    expected_matrix, expected_types, expected_freq = reference_mutation_matrix(mutations, top_n_genes)
+    mutation_matrix, mutation_codes, gene_freq_pct = create_mutation_matrix(mutations, top_n_genes)
+
+    assert list(mutation_matrix.index) == list(expected_matrix.index)
+    pd.testing.assert_frame_equal(mutation_matrix, expected_matrix, check_dtype=False, check_names=False)
+    types = {(gene, sample): priority_order[code]
+             for gene, row in mutation_codes.iterrows() for sample, code in row.items() if code >= 0}
+    assert types == dict(expected_types)
+    pd.testing.assert_series_equal(gene_freq_pct, expected_freq, check_names=False)
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("top_n_genes", [10, 30])
+def test_sort_samples_keeps_the_weight_order(seed, top_n_genes):
+    mutation_matrix, _, _ = create_mutation_matrix(synthetic_mutations(seed, n_samples=300), top_n_genes)
+    np.testing.assert_array_equal(sort_samples(mutation_matrix), reference_sort_samples(mutation_matrix))
+
+def test_sort_samples_beyond_float_weights_is_lexicographic():
+    # Samples that differ only past the 53rd gene tie in float weights, and the codes and burden tie further
+    rng = np.random.default_rng(0)
+    n_genes, n_samples = 60, 300
+    binary = np.zeros((n_genes, n_samples), dtype=bool)
+    binary[:3] = rng.random((3, n_samples)) < 0.5
+    binary[54:] = rng.random((n_genes - 54, n_samples)) < 0.5
+    codes = np.where(binary, rng.integers(0, 2, binary.shape), -1)
+    burden = rng.integers(0, 3, n_samples)
+    mutation_matrix = pd.DataFrame(binary.astype(int), index=[f"GENE{i}" for i in range(n_genes)])
+    reference = reference_sort_samples(mutation_matrix)
+    samples = range(n_samples)
+
+    expected = sorted(samples, key=lambda j: tuple(~binary[:, j]))
+    assert list(reference) != expected
+    np.testing.assert_array_equal(sort_samples(mutation_matrix), expected)
+    expected = sorted(samples, key=lambda j: (tuple(~binary[:, j]), tuple(codes[:, j]), -burden[j]))
+    np.testing.assert_array_equal(sort_samples(mutation_matrix, codes, burden), expected)
@@ -0,0 +1,67 @@
+import os
+import gzip
+import time
+import shutil
+import pytest
+import benchmark
+from mutation_store import read_maf, maf_cols, maf_case_files, build_store, is_stale
+from mutation_landscape import read_maf_files
+
+maf_text = (
+    "#version 2.4\n"
+    "#annotation.spec gdc-1.0.1-public\n"
+    "Hugo_Symbol\tEntrez_Gene_Id\tVariant_Classification\tTumor_Sample_Barcode\n"
+    "KRAS\t3845\tMissense_Mutation\tTCGA-AA-0001-01A-11D-A000-08\n"
+    "TP53\t7157\tNonsense_Mutation\tTCGA-AA-0001-01A-11D-A000-08\n"
+    "SMAD4\t4089\tSilent\tTCGA-AA-0001-01A-11D-A000-08\n"
+)
+
+def write_maf(path):
+    if str(path).endswith(".gz"):
+        with gzip.open(path, "wt") as f:
+            f.write(maf_text)
+    else:
+        path.write_text(maf_text)
+    return str(path)
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+@pytest.mark.parametrize("name", ["case.maf", "case.maf.gz"])
+def test_read_maf_skips_version_lines(tmp_path, engine, name):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    df = read_maf(write_maf(tmp_path / name), engine=engine)
+    assert list(df.columns) == maf_cols
+    assert df['Hugo_Symbol'].tolist() == ['KRAS', 'TP53', 'SMAD4']
+    assert df['Variant_Classification'].tolist() == ['Missense_Mutation', 'Nonsense_Mutation', 'Silent']
+
+def test_store_goes_stale_on_added_changed_and_removed_mafs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _, snv_dir, _ = benchmark.generate_cohort(".", 6, 20, 10)
+    build_store([snv_dir])
+    assert not is_stale(snv_dir, "SYN")
+
+    cases = sorted(maf_case_files(snv_dir))
+    shutil.copy(maf_case_files(snv_dir)[cases[1]], os.path.join(snv_dir, "TCGA-XX-0039.maf"))
+    assert is_stale(snv_dir, "SYN")
+    mutations = read_maf_files(snv_dir, cases + ["TCGA-XX-0039"], cohort="SYN", workers=1)
+    assert mutations.attrs["maf_summary"]["missing"] == []
+
+    build_store([snv_dir])
+    os.remove(os.path.join(snv_dir, "TCGA-XX-0039.maf"))
+    assert is_stale(snv_dir, "SYN")
+
+    build_store([snv_dir])
+    with open(maf_case_files(snv_dir)[cases[0]], "w") as f:
+        f.write("#version 2.4\n" + "\t".join(maf_cols) + "\n")
+    os.utime(maf_case_files(snv_dir)[cases[0]], (time.time() + 5, time.time() + 5))
+    mutations = read_maf_files(snv_dir, cases, cohort="SYN", workers=1)
+    assert mutations.attrs["maf_summary"]["empty"] == [cases[0]]
+    assert cases[0] not in set(mutations['Tumor_Sample_Barcode'].astype(str).str[:12])
+
+    # Served from the rebuilt partition, the emptied case is still reported as empty rather than missing
+    os.utime(maf_case_files(snv_dir)[cases[0]], (time.time() - 5, time.time() - 5))
+    build_store([snv_dir], force=True)
+    assert not is_stale(snv_dir, "SYN")
+    mutations = read_maf_files(snv_dir, cases + ["TCGA-XX-0039"], cohort="SYN", workers=1)
+    assert mutations.attrs["maf_summary"]["empty"] == [cases[0]]
+    assert mutations.attrs["maf_summary"]["missing"] == ["TCGA-XX-0039"]
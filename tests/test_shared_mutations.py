@@ -0,0 +1,40 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import benchmark
+from mutation_store import maf_case_files, read_mafs
+from shared_mutations import build_dataset, update_dataset, dataset_cols
+
+def make_cohorts(cohorts):
+    for seed, cohort in enumerate(cohorts):
+        _, snv_dir, _ = benchmark.generate_cohort(f"gen_{cohort}", 8, 150, 20, seed=seed)
+        shutil.move(snv_dir, f"data_snv_{cohort}")
+
+def test_frame_is_a_view_of_the_memory_maps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_cohorts(["AAA", "BBB"])
+    dataset = build_dataset(["AAA", "BBB"], "shared", workers=1)
+
+    for cohort in ["AAA", "BBB", None]:
+        frame = dataset.frame(cohort)
+        for col in dataset_cols:
+            assert np.shares_memory(frame[col].array.codes, dataset.codes[col])
+
+    expected, _ = read_mafs(maf_case_files("data_snv_BBB"), workers=1)
+    pd.testing.assert_frame_equal(dataset.frame("BBB").astype(str), expected[dataset_cols].astype(str))
+
+    case_ids = sorted(maf_case_files("data_snv_AAA"))[:3]
+    assert set(dataset.frame("AAA", case_ids)['case_id']) == set(case_ids)
+
+def test_update_dataset_rereads_changed_cohorts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_cohorts(["AAA", "BBB"])
+    before = update_dataset(["AAA", "BBB"], "shared", workers=1).frame("AAA").astype(str)
+
+    maf_file = sorted(maf_case_files("data_snv_BBB").values())[0]
+    os.remove(maf_file)
+    dataset = update_dataset(["AAA", "BBB"], "shared", workers=1)
+    expected, _ = read_mafs(maf_case_files("data_snv_BBB"), workers=1)
+    assert len(dataset.frame("BBB")) == len(expected)
+    pd.testing.assert_frame_equal(dataset.frame("AAA").astype(str), before)
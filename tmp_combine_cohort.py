@@ -1,88 +1,146 @@
 import pandas as pd
 import os
 import re
+import json
+from concurrent.futures import ProcessPoolExecutor
+from cancer_types import cancer_types, clinical_fields, cohort_columns
 
-def combine_clinical_cohorts(directory_path):
+n_workers = os.cpu_count() or 1  # clinical files parsed in parallel
+output_file = "combined_clinical_cohorts.parquet"
+
+# TCGA placeholders for missing values, e.g. "[Not Available]" or "[Discrepancy]"
+missing_pattern = r'^\[.*\]$'
+category_fields = ['cohort', 'histology', 'diagnosis', 'stage', 'vital_status', 'gender', 'race']
+
+def read_cohort_file(file_path, cohort):
     """
-    Combines clinical patient data from multiple cancer cohorts into a single DataFrame.
-    
+    Reads one clinical patient file and maps it onto the harmonised schema.
+
     Parameters:
-    directory_path (str): Path to directory containing the clinical patient files
-    
+    file_path (str): Path to the clinical patient file
+    cohort (str): Cohort of the file, e.g. 'PAAD'
+
     Returns:
-    pandas.DataFrame: Combined data from all cohorts with cohort information
+    pandas.DataFrame: One row per patient with the clinical_fields, histology, cohort and source_file,
+    or None if the file could not be read
     """
-    # Initialize empty list to store DataFrames
-    dfs = []
-    
+    try:
+        # The first row is the header, the 2nd and 3rd rows are metadata
+        df = pd.read_csv(file_path, sep='\t', skiprows=[1, 2], dtype=str)
+
+        # Pick each field from its cohort specific column
+        table = pd.DataFrame(index=df.index)
+        for field, col in cohort_columns(cohort).items():
+            table[field] = df[col] if col in df.columns else pd.NA
+        table = table.replace(missing_pattern, pd.NA, regex=True)
+        table['histology'] = table['diagnosis']
+        table['diagnosis'] = table['histology'].map(cancer_types[cohort]['diagnoses'])
+        table['cohort'] = cohort
+        table['source_file'] = os.path.basename(file_path)
+        return table
+    except Exception as e:
+        print(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+        return None
+
+def source_files(directory_path):
+    """Map each configured cohort to its clinical patient file in a directory"""
     # Pattern to match clinical patient files and extract cancer type
     pattern = r'clinical_patient_([a-zA-Z]+)\.txt$'
-    
-    # Iterate through files in directory
-    for filename in os.listdir(directory_path):
-        if 'clinical_patient' in filename and filename.endswith('.txt'):
-            file_path = os.path.join(directory_path, filename)
-            
-            # Extract cancer type from filename
-            match = re.search(pattern, filename)
-            if match:
-                cancer_type = match.group(1).upper()
-                
-                try:
-                    # Read the file
-                    # Using sep='\t' since the files appear to be tab-delimited
-                    # Read headers first (first row)
-                    headers = pd.read_csv(file_path, sep='\t', nrows=1)
-                    
-                    # Read the actual data (skip the first 3 rows - header + 2 metadata rows)
-                    df = pd.read_csv(file_path, sep='\t', skiprows=[1, 2], names=headers.columns)
-                    
-                    # Add cancer type column
-                    df['cohort'] = cancer_type
-                    
-                    # Add source filename
-                    df['source_file'] = filename
-                    
-                    dfs.append(df)
-                    print(f"Successfully processed {filename}")
-                    
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")
-    
+    files = {}
+    for filename in sorted(os.listdir(directory_path)):
+        match = re.search(pattern, filename)
+        if not match:
+            continue
+        cancer_type = match.group(1).upper()
+        if cancer_type not in cancer_types:
+            print(f"Skipping {filename}: no column mapping for {cancer_type}")
+            continue
+        files[cancer_type] = os.path.join(directory_path, filename)
+    return files
+
+def source_signature(files):
+    """Size and mtime of every source file plus the cohort mappings, used to decide whether to rebuild"""
+    return {
+        "files": {cohort: [os.path.getsize(path), os.path.getmtime(path)] for cohort, path in files.items()},
+        "clinical_fields": clinical_fields,
+        "cancer_types": cancer_types,
+    }
+
+def combine_clinical_cohorts(directory_path, workers=n_workers):
+    """
+    Combines clinical patient data from multiple cancer cohorts into a single typed DataFrame.
+
+    Parameters:
+    directory_path (str): Path to directory containing the clinical patient files
+    workers (int): Number of processes reading files
+
+    Returns:
+    pandas.DataFrame: Combined data from all cohorts in the harmonised schema, with the cohorts
+    whose file could not be read in attrs["failed"]
+    """
+    files = source_files(directory_path)
+    if not files:
+        raise ValueError("No valid files were processed")
+
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(executor.map(read_cohort_file, files.values(), files.keys()))
+    dfs = []
+    failed = [cohort for cohort, df in zip(files, results) if df is None]
+    for path, df in zip(files.values(), results):
+        if df is not None:
+            dfs.append(df)
+            print(f"Successfully processed {os.path.basename(path)}")
     if not dfs:
         raise ValueError("No valid files were processed")
-    
+
     # Combine all DataFrames
     combined_df = pd.concat(dfs, ignore_index=True)
-    
-    # Basic cleaning
-    # Remove any completely empty columns
-    combined_df = combined_df.dropna(axis=1, how='all')
-    
-    # Remove any duplicate rows
-    combined_df = combined_df.drop_duplicates()
-    
+
+    # Harmonised types
+    combined_df['case_id'] = combined_df['case_id'].astype('string')
+    combined_df['days_death'] = pd.to_numeric(combined_df['days_death'], errors='coerce').astype('Int64')
+    for field in category_fields:
+        combined_df[field] = combined_df[field].astype('category')
+    combined_df['source_file'] = combined_df['source_file'].astype('category')
+
+    # Remove any duplicate patients
+    combined_df = combined_df.drop_duplicates(subset=['cohort', 'case_id'])
+
     # Print summary statistics
     print("\nSummary:")
     print(f"Total number of patients: {len(combined_df)}")
     print("\nPatients per cohort:")
     print(combined_df['cohort'].value_counts())
-    print("\nColumns in combined dataset:", len(combined_df.columns))
-    
+
+    combined_df = combined_df[clinical_fields + ['histology', 'cohort', 'source_file']]
+    combined_df.attrs["failed"] = failed
     return combined_df
 
+def load_clinical_cohorts(directory_path, output_file=output_file, workers=n_workers):
+    """Return the combined clinical table, rebuilding the Parquet file only when a source file or mapping changed"""
+    signature_file = output_file + ".sources.json"
+    files = source_files(directory_path)
+    signature = source_signature(files)
+    if os.path.exists(output_file) and os.path.exists(signature_file):
+        with open(signature_file) as f:
+            if json.load(f) == json.loads(json.dumps(signature)):
+                return pd.read_parquet(output_file)
+
+    combined_data = combine_clinical_cohorts(directory_path, workers)
+    combined_data.to_parquet(output_file, index=False)
+    # Files that failed to parse are left out of the signature, so the next run tries them again
+    failed = set(combined_data.attrs.get("failed", []))
+    with open(signature_file, "w") as f:
+        json.dump(source_signature({cohort: path for cohort, path in files.items() if cohort not in failed}), f)
+    print(f"\nCombined data saved to {output_file}")
+    return combined_data
+
 # Example usage:
 if __name__ == "__main__":
     # Replace with your directory path
     directory_path = "./data_clinical"
-    
+
     try:
-        combined_data = combine_clinical_cohorts(directory_path)
-        
-        # Save combined data
-        output_file = "combined_clinical_cohorts.csv"
-        combined_data.to_csv(output_file, index=False)
-        print(f"\nCombined data saved to {output_file}")
-        
+        load_clinical_cohorts(directory_path)
     except Exception as e:
-        print(f"Error: {str(e)}")
\ No newline at end of file
+        print(f"Error: {str(e)}")
@@ -1,13 +1,11 @@
-import requests
-import json
 import os
 from urllib.request import urlretrieve
+from gdc_api import query_files, data_endpt, get_session, make_request_with_retry, stream_to_file
+from download_manifest import DownloadManifest
 
 def explore_available_files():
     """Explore what RNA-seq files are available for TCGA-LIHC"""
     
-    files_endpt = "https://api.gdc.cancer.gov/files"
-    
     # Set up the query filters - just looking for TCGA-LIHC RNA-seq files
     filters = {
         "op": "and",
@@ -29,27 +27,12 @@ def explore_available_files():
         ]
     }
 
-    # Define the query parameters
-    params = {
-        "filters": json.dumps(filters),
-        "fields": "file_id,file_name,data_type,data_format,experimental_strategy",
-        "format": "JSON",
-        "size": "1000"
-    }
-    
-    # Make the API call
-    response = requests.get(files_endpt, params=params)
-    
-    # Parse the results
-    file_data = json.loads(response.content.decode("utf-8"))
-    
-    return file_data["data"]["hits"]
+    # Query every page of matching files (cached between runs)
+    return query_files(filters, "file_id,file_name,data_type,data_format,experimental_strategy")
 
 def get_file_ids(file_name_pattern):
     """Get file IDs for RNA-seq gene counts from TCGA-LIHC"""
     
-    files_endpt = "https://api.gdc.cancer.gov/files"
-    
     # Set up the query filters
     filters = {
         "op": "and",
@@ -78,32 +61,20 @@ def get_file_ids(file_name_pattern):
         ]
     }
 
-    # Define the query parameters
-    params = {
-        "filters": json.dumps(filters),
-        "fields": "file_id,file_name,cases.submitter_id",
-        "format": "JSON",
-        "size": "1000"
-    }
-    
-    # Make the API call
-    response = requests.get(files_endpt, params=params)
-    
-    # Parse the results
-    file_data = json.loads(response.content.decode("utf-8"))
-    
-    return file_data["data"]["hits"]
+    # Query every page of matching files (cached between runs)
+    return query_files(filters, "file_id,file_name,md5sum,file_size,cases.submitter_id")
 
 def download_files(file_hits, output_dir="LIHC_RNA_counts"):
     """Download files from GDC using file IDs"""
     
-    data_endpt = "https://api.gdc.cancer.gov/data/"
-    
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Download each file
+    session = get_session()
+    manifest = DownloadManifest(output_dir)
+
+    # Download each new, changed or failed file
     for hit in file_hits:
         file_id = hit["file_id"]
         case_id = hit["cases"][0]["submitter_id"]
@@ -111,19 +82,25 @@ def download_files(file_hits, output_dir="LIHC_RNA_counts"):
         
         # Create the output filename
         output_file = os.path.join(output_dir, f"{case_id}_{file_name}")
-        if os.path.exists(output_file):
+        if not manifest.needs_download(hit, output_file):
             continue
         
-        # Download the file
+        # Download the file, checking its md5 as it streams to disk
         print(f"Downloading {case_id}...")
-        response = requests.get(f"{data_endpt}{file_id}", headers={"Content-Type": "application/json"})
-        
-        # Save the file
-        with open(output_file, 'wb') as f:
-            f.write(response.content)
+        try:
+            response = make_request_with_retry(f"{data_endpt}{file_id}", headers={"Content-Type": "application/json"},
+                                               session=session, stream=True)
+            stream_to_file(response, output_file, md5sum=hit.get("md5sum"))
+        except Exception as e:
+            manifest.mark_failed(hit, output_file, e)
+            print(f"Error downloading {case_id}: {str(e)}")
+            continue
+        manifest.mark_done(hit, output_file)
             
         print(f"Saved to {output_file}")
 
+    manifest.close()
+
 def main():
     # First, let's explore what files are available
     print("Exploring available RNA-seq files in TCGA-LIHC...")